@@ -0,0 +1,231 @@
+import asyncio
+import os
+import smtplib
+import time
+from datetime import datetime
+from email.message import EmailMessage
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Email configuration (optional)
+EMAIL_ADDRESS = os.getenv("EMAIL_ADDRESS")
+EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")
+ALERT_EMAIL = os.getenv("ALERT_EMAIL")
+
+# SMTP server - point these at a local stand-in (e.g. port 1025, no SSL, no password) for testing
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "465"))
+SMTP_USE_SSL = os.getenv("SMTP_USE_SSL", "true").lower() == "true"
+SMTP_TIMEOUT_SECONDS = float(os.getenv("SMTP_TIMEOUT_SECONDS", "30"))
+SMTP_IDLE_SECONDS = float(os.getenv("SMTP_IDLE_SECONDS", "60"))  # close the connection after this long unused
+
+# Dispatch behaviour
+ALERT_DIGEST_SECONDS = float(os.getenv("ALERT_DIGEST_SECONDS", "10"))  # how long a burst is collected
+ALERT_DIGEST_MAX = int(os.getenv("ALERT_DIGEST_MAX", "200"))           # sites per digest message
+ALERT_QUEUE_SIZE = int(os.getenv("ALERT_QUEUE_SIZE", "10000"))
+ALERT_MAX_RETRIES = int(os.getenv("ALERT_MAX_RETRIES", "5"))
+ALERT_RETRY_BASE_SECONDS = float(os.getenv("ALERT_RETRY_BASE_SECONDS", "2"))
+
+class AlertDispatcher:
+    """Queued email alerts, sent by one background task over one SMTP connection
+
+    enqueue() never blocks. The dispatcher collects transitions for
+    ALERT_DIGEST_SECONDS after the first one arrives and coalesces them per
+    site: a site that went UP -> Down -> UP within the window is reported once
+    as flapping. A single site gets the usual alert, several get one digest.
+    SMTP work runs in a worker thread on a connection that is kept open
+    between messages and reopened on failure; failed sends are retried with
+    exponential backoff.
+    """
+
+    def __init__(self, digest_seconds: float = ALERT_DIGEST_SECONDS, digest_max: int = ALERT_DIGEST_MAX,
+                 queue_size: int = ALERT_QUEUE_SIZE, max_retries: int = ALERT_MAX_RETRIES,
+                 retry_base: float = ALERT_RETRY_BASE_SECONDS):
+        self.digest_seconds = digest_seconds
+        self.digest_max = digest_max
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self._queue = asyncio.Queue(maxsize=queue_size)
+        self._smtp = None
+        self._task = None
+        self._closing = False
+        self._stats = {"queued": 0, "sent": 0, "digests": 0, "coalesced": 0, "dropped": 0, "failed": 0}
+
+    @property
+    def configured(self) -> bool:
+        return bool(EMAIL_ADDRESS and ALERT_EMAIL)
+
+    def enqueue(self, name: str, url: str, old_status: str, new_status: str):
+        """Queue a status transition for alerting"""
+        if not self.configured:
+            print("Email configuration not complete, skipping email alert")
+            return
+        try:
+            self._queue.put_nowait((name, url, old_status, new_status, datetime.utcnow()))
+            self._stats["queued"] += 1
+        except asyncio.QueueFull:
+            self._stats["dropped"] += 1
+            print(f"Alert queue full, dropped alert for {name}")
+
+    # ---------- Batching ----------
+
+    async def _collect(self, first) -> list:
+        """Everything that arrives within the digest window after `first`"""
+        batch = [first]
+        deadline = time.monotonic() + self.digest_seconds
+        while len(batch) < self.digest_max * 4:
+            timeout = deadline - time.monotonic()
+            if self._closing or timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=timeout))
+            except asyncio.TimeoutError:
+                break
+        # Whatever is already queued goes along without waiting
+        while not self._queue.empty() and len(batch) < self.digest_max * 4:
+            batch.append(self._queue.get_nowait())
+        return [item for item in batch if item is not None]
+
+    def _coalesce(self, batch: list) -> list:
+        """One entry per site: first old status, last new status, number of transitions"""
+        sites = {}
+        for name, url, old_status, new_status, at in batch:
+            if name in sites:
+                entry = sites[name]
+                entry["new_status"] = new_status
+                entry["transitions"] += 1
+                entry["last_at"] = at
+                self._stats["coalesced"] += 1
+            else:
+                sites[name] = {"name": name, "url": url, "old_status": old_status, "new_status": new_status,
+                               "transitions": 1, "first_at": at, "last_at": at}
+        return list(sites.values())
+
+    @staticmethod
+    def _describe(entry: dict) -> str:
+        if entry["transitions"] > 1:
+            return (f"{entry['name']} ({entry['url']}): flapping, {entry['transitions']} changes, "
+                    f"now {entry['new_status']}")
+        return f"{entry['name']} ({entry['url']}): {entry['old_status']} → {entry['new_status']}"
+
+    def _build_messages(self, entries: list) -> list:
+        messages = []
+        for start in range(0, len(entries), self.digest_max):
+            chunk = entries[start:start + self.digest_max]
+            msg = EmailMessage()
+            if len(chunk) == 1 and chunk[0]["transitions"] == 1:
+                entry = chunk[0]
+                msg["Subject"] = f"🚨 Status Alert: {entry['name']} is {entry['new_status']}"
+                msg.set_content(f"""
+Website Status Change Alert
+
+Website: {entry['name']}
+URL: {entry['url']}
+Status Changed: {entry['old_status']} → {entry['new_status']}
+Time: {entry['last_at'].strftime('%Y-%m-%d %H:%M:%S')} UTC
+
+This is an automated alert from your website monitoring system.
+        """)
+            else:
+                down = sum(1 for entry in chunk if entry["new_status"] != "UP")
+                msg["Subject"] = f"🚨 Status Alert: {len(chunk)} websites changed status ({down} down)"
+                lines = "\n".join(self._describe(entry) for entry in chunk)
+                msg.set_content(f"""
+Website Status Digest
+
+{lines}
+
+Period: {chunk[0]['first_at'].strftime('%Y-%m-%d %H:%M:%S')} - {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')} UTC
+
+This is an automated alert from your website monitoring system.
+        """)
+                self._stats["digests"] += 1
+            msg["From"] = EMAIL_ADDRESS
+            msg["To"] = ALERT_EMAIL
+            messages.append((msg, chunk))
+        return messages
+
+    # ---------- SMTP (worker thread) ----------
+
+    def _connect(self):
+        if SMTP_USE_SSL:
+            smtp = smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT_SECONDS)
+        else:
+            smtp = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT_SECONDS)
+        if EMAIL_PASSWORD:
+            smtp.login(EMAIL_ADDRESS, EMAIL_PASSWORD)
+        return smtp
+
+    def _send(self, msg: EmailMessage):
+        if self._smtp is None:
+            self._smtp = self._connect()
+        try:
+            self._smtp.send_message(msg)
+        except Exception:
+            # Connection state is unknown after a failure - start over next time
+            self._disconnect()
+            raise
+
+    def _disconnect(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except Exception:
+                pass
+            self._smtp = None
+
+    async def _send_with_retry(self, msg: EmailMessage, entries: list):
+        for attempt in range(self.max_retries + 1):
+            try:
+                await asyncio.to_thread(self._send, msg)
+                self._stats["sent"] += 1
+                print(f"Email alert sent: {msg['Subject']}")
+                return
+            except Exception as e:
+                if attempt == self.max_retries or self._closing:
+                    self._stats["failed"] += 1
+                    print(f"Error sending email alert for {', '.join(entry['name'] for entry in entries)}: {e}")
+                    return
+                delay = self.retry_base * (2 ** attempt)
+                print(f"Error sending email alert (attempt {attempt + 1}), retrying in {delay:.1f}s: {e}")
+                await asyncio.sleep(delay)
+
+    # ---------- Background task ----------
+
+    async def _run(self):
+        while not (self._closing and self._queue.empty()):
+            try:
+                first = await asyncio.wait_for(self._queue.get(), timeout=SMTP_IDLE_SECONDS)
+            except asyncio.TimeoutError:
+                await asyncio.to_thread(self._disconnect)
+                continue
+            if first is None:  # wake-up from close()
+                continue
+            batch = await self._collect(first)
+            for msg, entries in self._build_messages(self._coalesce(batch)):
+                await self._send_with_retry(msg, entries)
+
+    def start(self):
+        """Start the background dispatcher"""
+        if self._task is None:
+            self._closing = False
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self, timeout: float = 30):
+        """Send what is still queued (no digest wait, no long retries), then close the connection"""
+        self._closing = True
+        if self._task is not None:
+            try:
+                self._queue.put_nowait(None)  # wake the dispatcher if it is idle
+            except asyncio.QueueFull:
+                pass
+            try:
+                await asyncio.wait_for(self._task, timeout=timeout)
+            except asyncio.TimeoutError:
+                print(f"Alert dispatcher did not finish in {timeout}s, {self._queue.qsize()} alerts not sent")
+            self._task = None
+        await asyncio.to_thread(self._disconnect)
+
+    def stats(self) -> dict:
+        return {**self._stats, "pending": self._queue.qsize()}
@@ -0,0 +1,233 @@
+# bench_queries.py - Query-shape benchmark for database.py
+#
+#   python bench_queries.py --sites 50 --days 14 --output bench.json
+#   python bench_queries.py --no-seed --baseline bench.json
+#   python bench_queries.py --mongomock --sites 5 --days 2   (no mongod needed, no explain stats)
+#
+# Seeds N sites x M days of synthetic history (plus rollups) into DB_NAME
+# StatusListBench, times each database.py query helper at several window sizes
+# and records explain stats (documents examined vs. returned). The JSON output
+# carries the git commit so runs can be compared; --baseline exits non-zero
+# when a query got slower than --threshold or examines more documents.
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+import mongo
+from rollups import rollup_updates, window_filter, bucket_start
+
+def git_revision() -> str:
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True).stdout
+        return (revision or "unknown") + ("-dirty" if dirty.strip() else "")
+    except OSError:
+        return "unknown"
+
+# ---------- Seeding ----------
+
+async def seed(database, sites: int, days: int, interval_minutes: int):
+    """Replace the bench database with sites x days of checks, one every interval_minutes"""
+    random.seed(42)
+    for name in await database.history.existing():
+        await mongo.database.drop_collection(name)
+    await mongo.database.drop_collection("analytics")
+    await mongo.database.drop_collection("status")
+    database.history._indexed.clear()
+    await mongo.ensure_indexes()
+
+    now = datetime.utcnow()
+    await database.collection.insert_many([
+        {"name": f"site-{i}", "url": f"https://www.example-{i}.com", "status": "UP", "last_updated": now}
+        for i in range(sites)
+    ])
+
+    checks = days * 24 * 60 // interval_minutes
+    started = time.perf_counter()
+    for i in range(sites):
+        batch = []
+        for step in range(checks):
+            up = random.random() < 0.97
+            batch.append({
+                "name": f"site-{i}",
+                "url": f"https://www.example-{i}.com",
+                "status": "UP" if up else "Down",
+                "response_time": random.lognormvariate(-1.5, 0.6) if up else None,
+                "status_code": 200 if up else 503,
+                "checked_at": now - timedelta(minutes=step * interval_minutes)
+            })
+            if len(batch) >= 5000:
+                await flush(database, batch)
+                batch = []
+        if batch:
+            await flush(database, batch)
+    print(f"Seeded {sites * checks:,} checks in {time.perf_counter() - started:.1f}s")
+
+async def flush(database, batch: list):
+    # rollup_updates() reads the documents, insert_many() adds _id to them - rollups first
+    updates = rollup_updates(batch)
+    await database.history.insert_many(batch)
+    await database.analytics_collection.bulk_write(updates, ordered=False)
+
+# ---------- Explain ----------
+
+def _sum_stats(explain, stats: dict):
+    """Add up every executionStats block (one per shard / $cursor stage / partition)"""
+    if isinstance(explain, dict):
+        execution = explain.get("executionStats")
+        if isinstance(execution, dict):
+            stats["docs_examined"] += execution.get("totalDocsExamined", 0)
+            stats["keys_examined"] += execution.get("totalKeysExamined", 0)
+            stats["n_returned"] += execution.get("nReturned", 0)
+            return
+        for value in explain.values():
+            _sum_stats(value, stats)
+    elif isinstance(explain, list):
+        for value in explain:
+            _sum_stats(value, stats)
+
+async def explain_commands(commands: list) -> dict:
+    stats = {"docs_examined": 0, "keys_examined": 0, "n_returned": 0}
+    try:
+        for command in commands:
+            _sum_stats(await mongo.database.command({"explain": command, "verbosity": "executionStats"}), stats)
+    except Exception as e:
+        print(f"  explain unavailable: {e}")
+        return {}
+    return stats
+
+def query_shapes(database, name: str, hours: int) -> dict:
+    """The commands each helper sends, for explain"""
+    since = datetime.utcnow() - timedelta(hours=hours)
+    partitions = database.history.overlapping(since)
+    rollup_find = [{"find": "analytics", "filter": window_filter(name, since)}]
+    return {
+        "get_status_history": [
+            {"find": partition, "filter": {"name": name, "checked_at": {"$gte": since}},
+             "sort": {"checked_at": -1}, "limit": 100}
+            for partition in partitions
+        ],
+        "get_uptime_analytics": rollup_find,
+        "get_response_time_analytics": rollup_find,
+        "get_hourly_status_trend": [{
+            "find": "analytics",
+            "filter": {"name": name, "granularity": "hour", "bucket": {"$gte": bucket_start(since, "hour")}},
+            "sort": {"bucket": 1}
+        }],
+        "get_summary_stats": [
+            {"aggregate": partition, "cursor": {},
+             "pipeline": [{"$match": {"checked_at": {"$gte": since}, "status": {"$exists": True}}},
+                          {"$group": {"_id": "$name", "total_checks": {"$sum": 1}}}]}
+            for partition in partitions
+        ]
+    }
+
+# ---------- Timing ----------
+
+async def time_call(call, repeat: int) -> dict:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await call()
+        timings.append((time.perf_counter() - started) * 1000)
+    return {"median_ms": round(statistics.median(timings), 3), "min_ms": round(min(timings), 3)}
+
+async def run(database, windows: list, repeat: int, explain: bool = True) -> dict:
+    name = "site-0"
+    helpers = {
+        "get_status_history": lambda hours: database.get_status_history(name, hours),
+        "get_uptime_analytics": lambda hours: database.get_uptime_analytics(name, hours),
+        "get_response_time_analytics": lambda hours: database.get_response_time_analytics(name, hours),
+        "get_hourly_status_trend": lambda hours: database.get_hourly_status_trend(name, hours),
+        "get_summary_stats": lambda hours: database.get_summary_stats(hours)
+    }
+    results = {}
+    for hours in windows:
+        shapes = query_shapes(database, name, hours)
+        for helper, call in helpers.items():
+            key = f"{helper}[{hours}h]"
+            result = await time_call(lambda: call(hours), repeat)
+            if explain:
+                result.update(await explain_commands(shapes[helper]))
+            results[key] = result
+            print(f"{key:<40} {result['median_ms']:9.2f} ms  examined {result.get('docs_examined', '-')}"
+                  f"  returned {result.get('n_returned', '-')}")
+    results["get_all_websites_summary"] = await time_call(database.get_all_websites_summary, repeat)
+    print(f"{'get_all_websites_summary':<40} {results['get_all_websites_summary']['median_ms']:9.2f} ms")
+    return results
+
+# ---------- Comparison ----------
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Keys that got slower than threshold x baseline or examine more documents"""
+    regressions = []
+    print(f"\nAgainst {baseline.get('git', 'baseline')}:")
+    for key, result in results.items():
+        before = baseline.get("results", {}).get(key)
+        if before is None:
+            continue
+        ratio = result["median_ms"] / before["median_ms"] if before["median_ms"] else 1.0
+        examined, examined_before = result.get("docs_examined", "-"), before.get("docs_examined", "-")
+        slower = ratio > threshold
+        scans_more = "-" not in (examined, examined_before) and examined > examined_before
+        flag = "  REGRESSION" if slower or scans_more else ""
+        print(f"{key:<40} {ratio:6.2f}x  examined {examined_before} -> {examined}{flag}")
+        if flag:
+            regressions.append(key)
+    return regressions
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark database.py query helpers")
+    parser.add_argument("--sites", type=int, default=20)
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--interval-minutes", type=int, default=5)
+    parser.add_argument("--windows", default="1,24,168", help="comma separated window sizes in hours")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--db-name", default="StatusListBench")
+    parser.add_argument("--no-seed", action="store_true", help="reuse the data from a previous run")
+    parser.add_argument("--mongomock", action="store_true", help="in-process mongomock instead of DB_URL")
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--baseline", help="JSON from an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="slowdown ratio counted as a regression")
+    args = parser.parse_args()
+
+    mongo.DB_NAME = args.db_name
+    if args.mongomock:
+        from mongomock_motor import AsyncMongoMockClient
+        mongo._client = AsyncMongoMockClient()
+    import database
+
+    if not args.no_seed:
+        await seed(database, args.sites, args.days, args.interval_minutes)
+
+    windows = [int(hours) for hours in args.windows.split(",")]
+    print(f"\nQuery benchmark - {args.sites} sites x {args.days} days, median of {args.repeat}")
+    print("=" * 50)
+    report = {
+        "git": git_revision(),
+        "timestamp": datetime.utcnow().isoformat(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        # mongomock has no explain
+        "results": await run(database, windows, args.repeat, explain=not args.mongomock)
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report["results"], json.load(f), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regressions")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,81 @@
+# bench_store.py - Memory footprint of the in-memory status store
+#
+#   python bench_store.py [sites]
+#
+# Compares bytes per site of store.SiteStore against the old
+# Dict[str, WebsiteStatus] of pydantic models.
+import random
+import sys
+import time
+import tracemalloc
+
+from store import SiteStore, STATUS_UP, STATUS_DOWN, STATUSES, TRAFFIC_LABELS, traffic_code
+
+def fake_results(count: int) -> list:
+    random.seed(42)
+    results = []
+    for i in range(count):
+        status = STATUS_UP if random.random() < 0.95 else STATUS_DOWN
+        results.append((
+            f"site-{i}",
+            f"https://www.example-{i}.com/health",
+            status,
+            random.uniform(0.05, 4.0),
+            200 if status == STATUS_UP else 503,
+            random.choice([None, random.randint(-5, 365)])
+        ))
+    return results
+
+def measure(build) -> tuple:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    store = build()
+    elapsed = time.perf_counter() - started
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return store, used, elapsed
+
+def build_site_store(results: list):
+    def build():
+        store = SiteStore()
+        for name, url, status, rt, code, ssl_days in results:
+            record = store.add(name, url)
+            store.record_result(record, status, rt, code, ssl_days)
+        return store
+    return build
+
+def build_pydantic_dict(results: list):
+    from main import WebsiteStatus
+
+    def build():
+        websites = {}
+        for name, url, status, rt, code, ssl_days in results:
+            websites[name] = WebsiteStatus(
+                name=name,
+                url=url,
+                status=STATUSES[status],
+                response_time=round(rt, 3),
+                status_code=code,
+                traffic_info=TRAFFIC_LABELS[traffic_code(rt, status)],
+                last_checked=time.strftime("%Y-%m-%d %H:%M:%S"),
+                ssl_expiry_days=ssl_days
+            )
+        return websites
+    return build
+
+def main():
+    sites = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    # The name/url strings exist in both layouts, so keep them out of the measurement
+    results = fake_results(sites)
+
+    print(f"Store memory benchmark - {sites:,} sites")
+    print("=" * 50)
+    for label, build in (("SiteStore (__slots__)", build_site_store(results)),
+                         ("Dict[str, WebsiteStatus]", build_pydantic_dict(results))):
+        store, used, elapsed = measure(build)
+        print(f"{label:<26} {used / sites:8.1f} bytes/site  {used / 2**20:8.1f} MiB  build {elapsed:.2f}s")
+        del store
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+import time
+from collections import OrderedDict
+
+class TTLCache:
+    """Small LRU cache whose entries also expire after ttl seconds
+
+    Each entry carries a marker (e.g. the site's last_updated timestamp); get()
+    only returns the value when the caller's current marker still matches.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, marker, value)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, marker=None):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic() or entry[1] != marker:
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[2]
+
+    def set(self, key, value, marker=None):
+        self._entries[key] = (time.monotonic() + self.ttl, marker, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, match):
+        """Drop every entry whose key satisfies match(key)"""
+        for key in [key for key in self._entries if match(key)]:
+            del self._entries[key]
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
@@ -1,18 +1,32 @@
-import motor.motor_asyncio
+from pymongo import ReturnDocument
 from model import Status, StatusHistory, AnalyticsData
+from rollups import rollup_updates, window_filter, merge_rollups, bucket_start, histogram_quantiles
+from partitions import HistoryPartitions
+import mongo
+import tsstore
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
-DB_URL = os.getenv("DB_URL", "mongodb://localhost:27017")
+HISTORY_BACKEND = os.getenv("HISTORY_BACKEND", "mongo")  # mongo or columnar (tsstore.py)
 
-client = motor.motor_asyncio.AsyncIOMotorClient(DB_URL)
-database = client.StatusList
-collection = database.status
-history_collection = database.status_history
-analytics_collection = database.analytics
+# Shared lazily-connected client, see mongo.py
+database = mongo.database
+collection = mongo.collection("status")
+history_collection = mongo.collection("status_history")
+analytics_collection = mongo.collection("analytics")
+# status_history, or its day/week partitions (see partitions.py)
+history = HistoryPartitions(database)
+
+def history_backend(function):
+    """Serve a history/analytics function from the columnar chunk files when HISTORY_BACKEND=columnar
+
+    tsstore.py has a function of the same name and signature for each one
+    decorated with this - the backend is chosen here and nowhere else.
+    """
+    return getattr(tsstore, function.__name__) if HISTORY_BACKEND == "columnar" else function
 
 def fix_mongo_id(document):
     """Convert ObjectId to string in a MongoDB document"""
@@ -32,6 +46,11 @@ async def fetch_one_status(name):
     document = await collection.find_one({"name": name})
     return fix_mongo_id(document) if document else None
 
+async def get_history_marker(name: str):
+    """last_updated of a site's status doc - changes whenever a new check is recorded"""
+    document = await collection.find_one({"name": name}, {"last_updated": 1})
+    return document.get("last_updated") if document else None
+
 async def create_status(status_data):
     result = await collection.insert_one(status_data)
     new_status = await collection.find_one({"_id": result.inserted_id})
@@ -39,17 +58,17 @@ async def create_status(status_data):
 
 async def update_status(name: str, status: str):
     try:
-        # Get old status for comparison
-        old_doc = await collection.find_one({"name": name})
-        old_status = old_doc["status"] if old_doc else None
-        
-        result = await collection.update_one(
+        # Update and get the previous document in one round trip
+        now = datetime.utcnow()
+        old_doc = await collection.find_one_and_update(
             {"name": name}, 
-            {"$set": {"status": status, "last_updated": datetime.utcnow()}}
+            {"$set": {"status": status, "last_updated": now}},
+            return_document=ReturnDocument.BEFORE
         )
         
-        if result.modified_count > 0:
-            document = await collection.find_one({"name": name})
+        if old_doc:
+            old_status = old_doc.get("status")
+            document = {**old_doc, "status": status, "last_updated": now}
             
             # Log status change if different
             if old_status != status:
@@ -66,32 +85,40 @@ async def remove_status(name: str):
         result = await collection.delete_one({"name": name})
         if result.deleted_count > 0:
             # Clean up history for this website
-            await history_collection.delete_many({"name": name})
-            await analytics_collection.delete_many({"name": name})
+            await remove_history(name)
         return result.deleted_count > 0
     except Exception as e:
         print(f"Error removing status: {e}")
         return False
 
+@history_backend
+async def remove_history(name: str):
+    await history.delete_site(name)
+    await analytics_collection.delete_many({"name": name})
+
 # New analytics and logging functions
+@history_backend
 async def log_status_history(name: str, url: str, status: str, response_time: float = None, status_code: int = None):
     """Log each status check with detailed information"""
     try:
-        await history_collection.insert_one({
+        document = {
             "name": name,
             "url": url,
             "status": status,
             "response_time": response_time,
             "status_code": status_code,
             "checked_at": datetime.utcnow()
-        })
+        }
+        await history.insert_one(document)
+        await analytics_collection.bulk_write(rollup_updates([document]), ordered=False)
     except Exception as e:
         print(f"Error logging status history: {e}")
 
+@history_backend
 async def log_status_change(name: str, old_status: str, new_status: str):
     """Log when a website status changes"""
     try:
-        await history_collection.insert_one({
+        await history.insert_one({
             "name": name,
             "event_type": "status_change",
             "old_status": old_status,
@@ -101,40 +128,31 @@ async def log_status_change(name: str, old_status: str, new_status: str):
     except Exception as e:
         print(f"Error logging status change: {e}")
 
+@history_backend
 async def get_status_history(name: str, hours: int = 24, limit: int = 100):
     """Get status history for a website"""
     try:
         since = datetime.utcnow() - timedelta(hours=hours)
-        cursor = history_collection.find({
-            "name": name,
-            "checked_at": {"$gte": since}
-        }).sort("checked_at", -1).limit(limit)
-        
-        history = []
-        async for document in cursor:
-            history.append(fix_mongo_id(document))
-        return history
+        # Only the partitions overlapping the window are queried, newest first
+        documents = await history.find_recent({"name": name}, since, limit)
+        return [fix_mongo_id(document) for document in documents]
     except Exception as e:
         print(f"Error fetching status history: {e}")
         return []
 
+async def get_rollup_totals(name: str, hours: int = 24):
+    """Merged minute/hour/day rollups covering the last `hours` hours"""
+    since = datetime.utcnow() - timedelta(hours=hours)
+    documents = await analytics_collection.find(window_filter(name, since)).to_list(length=None)
+    return merge_rollups(documents)
+
+@history_backend
 async def get_uptime_analytics(name: str, hours: int = 24):
-    """Calculate uptime statistics for a website"""
+    """Calculate uptime statistics for a website (from rollups)"""
     try:
-        since = datetime.utcnow() - timedelta(hours=hours)
-        
-        # Count total checks and UP status
-        total_checks = await history_collection.count_documents({
-            "name": name,
-            "checked_at": {"$gte": since},
-            "status": {"$exists": True}
-        })
-        
-        up_checks = await history_collection.count_documents({
-            "name": name,
-            "checked_at": {"$gte": since},
-            "status": "UP"
-        })
+        totals = await get_rollup_totals(name, hours)
+        total_checks = totals["count"]
+        up_checks = totals["up"]
         
         if total_checks == 0:
             return {"uptime_percentage": 0, "total_checks": 0, "up_checks": 0, "down_checks": 0}
@@ -152,129 +170,144 @@ async def get_uptime_analytics(name: str, hours: int = 24):
         print(f"Error calculating uptime analytics: {e}")
         return {"uptime_percentage": 0, "total_checks": 0, "up_checks": 0, "down_checks": 0}
 
+@history_backend
 async def get_response_time_analytics(name: str, hours: int = 24):
-    """Get response time analytics for a website"""
+    """Get response time analytics for a website (from rollups)"""
     try:
-        since = datetime.utcnow() - timedelta(hours=hours)
-        
-        pipeline = [
-            {
-                "$match": {
-                    "name": name,
-                    "checked_at": {"$gte": since},
-                    "response_time": {"$exists": True, "$ne": None}
-                }
-            },
-            {
-                "$group": {
-                    "_id": None,
-                    "avg_response_time": {"$avg": "$response_time"},
-                    "min_response_time": {"$min": "$response_time"},
-                    "max_response_time": {"$max": "$response_time"},
-                    "count": {"$sum": 1}
-                }
-            }
-        ]
-        
-        result = await history_collection.aggregate(pipeline).to_list(length=1)
+        totals = await get_rollup_totals(name, hours)
         
-        if result:
-            data = result[0]
+        if totals["rt_count"]:
+            # Percentiles come from the merged latency histograms
+            p50, p95, p99 = histogram_quantiles(
+                totals["hist"], (0.5, 0.95, 0.99), lower=totals["rt_min"], upper=totals["rt_max"]
+            )
             return {
-                "avg_response_time": round(data["avg_response_time"], 3) if data["avg_response_time"] else 0,
-                "min_response_time": round(data["min_response_time"], 3) if data["min_response_time"] else 0,
-                "max_response_time": round(data["max_response_time"], 3) if data["max_response_time"] else 0,
-                "total_measurements": data["count"]
+                "avg_response_time": round(totals["rt_sum"] / totals["rt_count"], 3),
+                "min_response_time": round(totals["rt_min"], 3) if totals["rt_min"] else 0,
+                "max_response_time": round(totals["rt_max"], 3) if totals["rt_max"] else 0,
+                "p50_response_time": round(p50, 3),
+                "p95_response_time": round(p95, 3),
+                "p99_response_time": round(p99, 3),
+                "total_measurements": totals["rt_count"]
             }
         
-        return {"avg_response_time": 0, "min_response_time": 0, "max_response_time": 0, "total_measurements": 0}
+        return {"avg_response_time": 0, "min_response_time": 0, "max_response_time": 0,
+                "p50_response_time": 0, "p95_response_time": 0, "p99_response_time": 0, "total_measurements": 0}
     except Exception as e:
         print(f"Error calculating response time analytics: {e}")
-        return {"avg_response_time": 0, "min_response_time": 0, "max_response_time": 0, "total_measurements": 0}
+        return {"avg_response_time": 0, "min_response_time": 0, "max_response_time": 0,
+                "p50_response_time": 0, "p95_response_time": 0, "p99_response_time": 0, "total_measurements": 0}
 
+@history_backend
 async def get_hourly_status_trend(name: str, hours: int = 24):
-    """Get hourly status trends for charts"""
+    """Get hourly status trends for charts (from hourly rollups)"""
     try:
-        since = datetime.utcnow() - timedelta(hours=hours)
-        
-        pipeline = [
-            {
-                "$match": {
-                    "name": name,
-                    "checked_at": {"$gte": since},
-                    "status": {"$exists": True}
-                }
-            },
-            {
-                "$group": {
-                    "_id": {
-                        "hour": {"$dateToString": {"format": "%Y-%m-%d %H:00", "date": "$checked_at"}},
-                        "status": "$status"
-                    },
-                    "count": {"$sum": 1}
-                }
-            },
-            {
-                "$group": {
-                    "_id": "$_id.hour",
-                    "statuses": {
-                        "$push": {
-                            "status": "$_id.status",
-                            "count": "$count"
-                        }
-                    },
-                    "total_checks": {"$sum": "$count"}
-                }
-            },
-            {"$sort": {"_id": 1}}
-        ]
+        since = bucket_start(datetime.utcnow() - timedelta(hours=hours), "hour")
         
-        result = await history_collection.aggregate(pipeline).to_list(length=None)
+        cursor = analytics_collection.find({
+            "name": name,
+            "granularity": "hour",
+            "bucket": {"$gte": since}
+        }).sort("bucket", 1)
         
         trend_data = []
-        for item in result:
-            hour_data = {"hour": item["_id"], "total_checks": item["total_checks"]}
-            
-            # Initialize status counts
-            up_count = 0
-            down_count = 0
-            
-            for status_info in item["statuses"]:
-                if status_info["status"] == "UP":
-                    up_count = status_info["count"]
-                elif status_info["status"] == "Down":
-                    down_count = status_info["count"]
-            
-            hour_data["up_count"] = up_count
-            hour_data["down_count"] = down_count
-            hour_data["uptime_percentage"] = (up_count / item["total_checks"]) * 100 if item["total_checks"] > 0 else 0
-            
-            trend_data.append(hour_data)
+        async for item in cursor:
+            total_checks = item.get("count", 0)
+            up_count = item.get("up", 0)
+            trend_data.append({
+                "hour": item["bucket"].strftime("%Y-%m-%d %H:00"),
+                "total_checks": total_checks,
+                "up_count": up_count,
+                "down_count": item.get("down", 0),
+                "uptime_percentage": (up_count / total_checks) * 100 if total_checks > 0 else 0
+            })
         
         return trend_data
     except Exception as e:
         print(f"Error getting hourly trend: {e}")
         return []
 
+async def backfill_rollups(hours: int = 24 * 35):
+    """Build rollups from raw status_history (one-off, for data logged before rollups existed)
+
+    Run it against an empty analytics collection - increments are added on top
+    of whatever is already there.
+    """
+    try:
+        since = datetime.utcnow() - timedelta(hours=hours)
+        batch = []
+        for partition in history.overlapping(since):
+            cursor = database[partition].find({"checked_at": {"$gte": since}, "status": {"$exists": True}})
+            async for document in cursor:
+                batch.append(document)
+                if len(batch) >= 1000:
+                    await analytics_collection.bulk_write(rollup_updates(batch), ordered=False)
+                    batch = []
+        if batch:
+            await analytics_collection.bulk_write(rollup_updates(batch), ordered=False)
+        print("Rollup backfill complete")
+    except Exception as e:
+        print(f"Error backfilling rollups: {e}")
+
+@history_backend
+async def get_summary_stats(hours: int = 24) -> dict:
+    """name -> total_checks, up_checks, avg_response_time over the last `hours` hours
+
+    One aggregation per overlapping partition; sums and counts are merged here.
+    """
+    since = datetime.utcnow() - timedelta(hours=hours)
+    
+    pipeline = [
+        {
+            "$match": {
+                "checked_at": {"$gte": since},
+                "status": {"$exists": True}
+            }
+        },
+        {
+            "$group": {
+                "_id": "$name",
+                "total_checks": {"$sum": 1},
+                "up_checks": {"$sum": {"$cond": [{"$eq": ["$status", "UP"]}, 1, 0]}},
+                # Missing and null response times are skipped, like $avg would
+                "rt_sum": {"$sum": "$response_time"},
+                "rt_count": {"$sum": {"$cond": [{"$gt": ["$response_time", None]}, 1, 0]}}
+            }
+        }
+    ]
+    
+    stats = {}
+    for item in await history.aggregate_each(since, pipeline):
+        site = stats.setdefault(item["_id"], {"total_checks": 0, "up_checks": 0, "rt_sum": 0, "rt_count": 0})
+        for key in site:
+            site[key] += item[key]
+    for site in stats.values():
+        site["avg_response_time"] = site["rt_sum"] / site["rt_count"] if site["rt_count"] else None
+    return stats
+
 async def get_all_websites_summary():
     """Get summary analytics for all websites"""
     try:
+        stats = await get_summary_stats(24)
+        
         websites = await fetch_all_statuses()
         summary = []
         
         for website in websites:
             name = website["name"]
-            uptime_data = await get_uptime_analytics(name, 24)
-            response_time_data = await get_response_time_analytics(name, 24)
+            site_stats = stats.get(name, {})
+            total_checks = site_stats.get("total_checks", 0)
+            uptime = round((site_stats["up_checks"] / total_checks) * 100, 2) if total_checks else 0
+            avg_response_time = site_stats.get("avg_response_time")
             
             summary.append({
                 "name": name,
                 "url": website["url"],
                 "current_status": website["status"],
                 "last_updated": website.get("last_updated"),
-                "uptime_24h": uptime_data["uptime_percentage"],
-                "avg_response_time": response_time_data["avg_response_time"],
-                "total_checks_24h": uptime_data["total_checks"]
+                "uptime_24h": uptime,
+                "avg_response_time": round(avg_response_time, 3) if avg_response_time else 0,
+                "total_checks_24h": total_checks
             })
         
         return summary
@@ -286,18 +319,12 @@ async def get_all_websites_summary():
 async def create_indexes():
     """Create database indexes for better query performance"""
     try:
-        # Index for history collection
-        await history_collection.create_index([("name", 1), ("checked_at", -1)])
-        await history_collection.create_index([("name", 1), ("status", 1), ("checked_at", -1)])
-        
-        # Index for main collection
-        await collection.create_index([("name", 1)])
-        
+        await mongo.ensure_indexes()
         print("Database indexes created successfully")
     except Exception as e:
         print(f"Error creating indexes: {e}")
 
 # Call this when starting the application
 async def initialize_database():
-    """Initialize database with indexes"""
-    await create_indexes()
\ No newline at end of file
+    """Initialize database with indexes and warn about query shapes that would scan collections"""
+    await mongo.bootstrap()
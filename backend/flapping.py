@@ -0,0 +1,119 @@
+import os
+
+# N-of-M confirmation: a transition is only accepted once enough of the last
+# FLAP_WINDOW probes agree. Coming back UP needs more agreement than going
+# Down (hysteresis), so a recovering site doesn't bounce straight back.
+FLAP_WINDOW = int(os.getenv("FLAP_WINDOW", "5"))
+FLAP_CONFIRM_DOWN = int(os.getenv("FLAP_CONFIRM_DOWN", "3"))
+FLAP_CONFIRM_UP = int(os.getenv("FLAP_CONFIRM_UP", "4"))
+
+# Flap score: +1 per raw status flip, multiplied by FLAP_SCORE_DECAY every probe.
+# A site is flapping from FLAP_START until the score decays below FLAP_STOP.
+FLAP_SCORE_DECAY = float(os.getenv("FLAP_SCORE_DECAY", "0.8"))
+FLAP_START = float(os.getenv("FLAP_START", "2.5"))
+FLAP_STOP = float(os.getenv("FLAP_STOP", "1.0"))
+
+class SiteState:
+    """Per-site detector state - a few machine words, no per-probe history list"""
+
+    __slots__ = ("confirmed", "bits", "count", "last_up", "score", "flapping")
+
+    def __init__(self, confirmed):
+        self.confirmed = confirmed  # "UP", "Down" or None before the first probe
+        self.bits = 0               # last FLAP_WINDOW raw results, 1 = failure, newest in bit 0
+        self.count = 0              # results in bits (< window until the window fills)
+        self.last_up = None
+        self.score = 0.0
+        self.flapping = False
+
+class FlapDetector:
+    """Debounces raw probe results into confirmed UP/Down transitions
+
+    observe() is O(1) per probe. While a raw result disagrees with the
+    confirmed status the transition is pending and pending() tells the
+    scheduler to re-probe soon, unless the site is flapping, in which case it
+    just keeps its normal schedule.
+    """
+
+    def __init__(self, window: int = FLAP_WINDOW, confirm_down: int = FLAP_CONFIRM_DOWN,
+                 confirm_up: int = FLAP_CONFIRM_UP, decay: float = FLAP_SCORE_DECAY,
+                 flap_start: float = FLAP_START, flap_stop: float = FLAP_STOP):
+        if not (0 < confirm_down <= window and 0 < confirm_up <= window):
+            raise ValueError("FLAP_CONFIRM_DOWN and FLAP_CONFIRM_UP must be between 1 and FLAP_WINDOW")
+        self.window = window
+        self.confirm_down = confirm_down
+        self.confirm_up = confirm_up
+        self.decay = decay
+        self.flap_start = flap_start
+        self.flap_stop = flap_stop
+        self._mask = (1 << window) - 1
+        self._sites = {}
+        self._stats = {"probes": 0, "raw_flips": 0, "confirmed_changes": 0}
+
+    def observe(self, name: str, status: str, known: str = None) -> tuple:
+        """Feed one raw probe result
+
+        known seeds a site seen for the first time (e.g. its status in the
+        database); "Checking" or None means the first result is taken as is.
+        Returns (previous confirmed status or None, confirmed status, flap event)
+        where flap event is "flapping", "stable" or None.
+        """
+        state = self._sites.get(name)
+        if state is None:
+            state = self._sites[name] = SiteState(known if known in ("UP", "Down") else None)
+
+        up = status == "UP"
+        state.bits = ((state.bits << 1) | (not up)) & self._mask
+        if state.count < self.window:
+            state.count += 1
+        flipped = state.last_up is not None and state.last_up != up
+        state.last_up = up
+        state.score = state.score * self.decay + flipped
+
+        self._stats["probes"] += 1
+        self._stats["raw_flips"] += flipped
+
+        previous = state.confirmed
+        if previous is None:
+            state.confirmed = "UP" if up else "Down"
+        else:
+            failures = bin(state.bits).count("1")
+            if previous == "UP" and failures >= self.confirm_down:
+                state.confirmed = "Down"
+            elif previous != "UP" and state.count - failures >= self.confirm_up:
+                state.confirmed = "UP"
+            if state.confirmed != previous:
+                self._stats["confirmed_changes"] += 1
+
+        event = None
+        if not state.flapping and state.score >= self.flap_start:
+            state.flapping = True
+            event = "flapping"
+        elif state.flapping and state.score < self.flap_stop:
+            state.flapping = False
+            event = "stable"
+        return previous, state.confirmed, event
+
+    def pending(self, name: str) -> bool:
+        """True while the latest raw result disagrees with the confirmed status"""
+        state = self._sites.get(name)
+        if state is None or state.flapping or state.last_up is None:
+            return False
+        return state.last_up != (state.confirmed == "UP")
+
+    def is_flapping(self, name: str) -> bool:
+        state = self._sites.get(name)
+        return state is not None and state.flapping
+
+    def retain(self, names):
+        """Forget sites that are no longer monitored"""
+        names = set(names)
+        for name in [name for name in self._sites if name not in names]:
+            del self._sites[name]
+
+    def stats(self) -> dict:
+        return {
+            **self._stats,
+            "sites": len(self._sites),
+            "flapping": sum(1 for state in self._sites.values() if state.flapping)
+        }
@@ -0,0 +1,46 @@
+import os
+import requests
+from requests.adapters import HTTPAdapter
+from probe_engine import ProbeEngine
+
+# Pool sizing for the synchronous session
+HTTP_POOL_HOSTS = int(os.getenv("HTTP_POOL_HOSTS", "100"))
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "10"))
+
+USER_AGENT = 'Mozilla/5.0 (Website Monitor Bot)'
+
+# Process-wide clients, created on first use
+_engine = None
+_session = None
+
+def get_engine() -> ProbeEngine:
+    """Shared async probe engine - keeps one keep-alive pool per host across all checks"""
+    global _engine
+    if _engine is None:
+        _engine = ProbeEngine()
+    return _engine
+
+def get_session() -> requests.Session:
+    """Shared pooled requests session for code paths that are still synchronous"""
+    global _session
+    if _session is None:
+        adapter = HTTPAdapter(pool_connections=HTTP_POOL_HOSTS, pool_maxsize=HTTP_POOL_MAXSIZE)
+        _session = requests.Session()
+        _session.mount("http://", adapter)
+        _session.mount("https://", adapter)
+        _session.headers.update({'User-Agent': USER_AGENT})
+    return _session
+
+async def startup():
+    """Open the shared pools - call from the app startup hook"""
+    await get_engine().start()
+
+async def shutdown():
+    """Close the shared pools - call from the app shutdown hook"""
+    global _engine, _session
+    if _engine is not None:
+        await _engine.close()
+        _engine = None
+    if _session is not None:
+        _session.close()
+        _session = None
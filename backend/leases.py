@@ -0,0 +1,180 @@
+import asyncio
+import hashlib
+import math
+import os
+import random
+import socket
+import time
+import uuid
+from pymongo.errors import DuplicateKeyError, BulkWriteError
+
+# Sharded checkers: 0 = off (one checker owns every site)
+CHECKER_SHARDS = int(os.getenv("CHECKER_SHARDS", "0"))
+CHECKER_LEASE_SECONDS = float(os.getenv("CHECKER_LEASE_SECONDS", "30"))
+CHECKER_HEARTBEAT_SECONDS = float(os.getenv("CHECKER_HEARTBEAT_SECONDS", "10"))
+CHECKER_WORKER_ID = os.getenv("CHECKER_WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+def shard_for(name: str, shards: int) -> int:
+    """Stable shard of a site - the same in every process and across restarts"""
+    digest = hashlib.blake2b(name.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % shards
+
+class LeaseManager:
+    """Splits the site list between checker workers through leases in Mongo
+
+    Every site maps to one of `shards` shards by a stable hash of its name.
+    Each shard is a document in the leases collection with an owner and an
+    expiry. On every heartbeat a worker renews its leases, counts the live
+    workers and moves towards its fair share ceil(shards / workers): it
+    claims free or expired shards (atomically, one find_one_and_update each)
+    or releases the ones it has too many. A dead worker's shards are picked up
+    by the others once its leases expire.
+
+    Lease and heartbeat times are set and compared by the server ($$NOW,
+    needs MongoDB 4.2+), so clock skew between workers doesn't matter. A worker
+    only treats its shards as owned until its last successful renewal plus the
+    lease time, measured on its own monotonic clock from before the renewal
+    was sent, so a worker cut off from Mongo stops probing before anyone else
+    can claim its shards - no site is probed twice.
+    """
+
+    def __init__(self, database, shards: int = CHECKER_SHARDS, worker_id: str = CHECKER_WORKER_ID,
+                 lease_seconds: float = CHECKER_LEASE_SECONDS, heartbeat_seconds: float = CHECKER_HEARTBEAT_SECONDS,
+                 on_lost=None):
+        if heartbeat_seconds * 2 > lease_seconds:
+            raise ValueError("CHECKER_HEARTBEAT_SECONDS must be at most half of CHECKER_LEASE_SECONDS")
+        self.leases = database["checker_leases"]
+        self.workers = database["checker_workers"]
+        self.shards = shards
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.owned = set()
+        self.changed = asyncio.Event()  # set whenever the owned shards change
+        self.on_lost = on_lost  # called with the shards we stopped owning, even if we claim them back
+        self._valid_until = 0.0  # monotonic
+        self._task = None
+        self._stats = {"heartbeats": 0, "claimed": 0, "released": 0, "errors": 0}
+
+    # ---------- Ownership ----------
+
+    def owns(self, name: str) -> bool:
+        if time.monotonic() > self._valid_until:
+            return False
+        return shard_for(name, self.shards) in self.owned
+
+    def _lost(self, shards: set):
+        # Another worker may have owned these in between - state cached for their sites is stale
+        if shards and self.on_lost is not None:
+            self.on_lost(set(shards))
+
+    def _set_owned(self, owned: set):
+        if owned != self.owned:
+            print(f"Checker {self.worker_id} owns {len(owned)}/{self.shards} shards")
+            self.owned = owned
+            self.changed.set()
+
+    # ---------- Heartbeat ----------
+
+    async def _ensure_shards(self):
+        try:
+            await self.leases.insert_many(
+                [{"_id": shard, "owner": None, "expires_at": None} for shard in range(self.shards)],
+                ordered=False
+            )
+        except (BulkWriteError, DuplicateKeyError):
+            pass  # already created by another worker
+        # Dead workers' heartbeat docs go away on their own
+        await self.workers.create_index([("heartbeat_at", 1)], expireAfterSeconds=3600)
+
+    async def heartbeat(self):
+        """Renew, rebalance and claim - one round"""
+        started = time.monotonic()
+        # Expiry is stamped and compared by the server clock ($$NOW), never a worker's
+        lease_ms = int(self.lease_seconds * 1000)
+        expires_at = {"$add": ["$$NOW", lease_ms]}
+        free = {"$or": [{"owner": None}, {"$expr": {"$lt": ["$expires_at", "$$NOW"]}}]}
+        # Shard docs left over from a larger CHECKER_SHARDS are never renewed or claimed
+        mine = {"_id": {"$lt": self.shards}, "owner": self.worker_id}
+
+        await self.workers.update_one(
+            {"_id": self.worker_id}, [{"$set": {"heartbeat_at": "$$NOW"}}], upsert=True
+        )
+        await self.leases.update_many(mine, [{"$set": {"expires_at": expires_at}}])
+        owned = {doc["_id"] for doc in await self.leases.find(mine, {"_id": 1}).to_list(length=None)}
+        self._lost(self.owned - owned)
+        # Leases were renewed after `started`, so they are good until at least started + lease_seconds
+        # on our own monotonic clock
+        self._valid_until = started + self.lease_seconds
+
+        live = await self.workers.count_documents(
+            {"$expr": {"$gte": ["$heartbeat_at", {"$subtract": ["$$NOW", lease_ms]}]}}
+        )
+        fair_share = math.ceil(self.shards / max(live, 1))
+
+        if len(owned) > fair_share:
+            # Shed the extras so a new worker can pick them up right away
+            extra = sorted(owned)[fair_share:]
+            owned -= set(extra)
+            self._lost(set(extra))
+            self._set_owned(set(owned))
+            await self.leases.update_many(
+                {"_id": {"$in": extra}, "owner": self.worker_id},
+                [{"$set": {"owner": None, "expires_at": "$$NOW"}}]
+            )
+            self._stats["released"] += len(extra)
+        elif len(owned) < fair_share:
+            candidates = await self.leases.find({"_id": {"$lt": self.shards}, **free}, {"_id": 1}).to_list(length=None)
+            random.shuffle(candidates)
+            for doc in candidates:
+                if len(owned) >= fair_share:
+                    break
+                claimed = await self.leases.find_one_and_update(
+                    {"_id": doc["_id"], **free},
+                    [{"$set": {"owner": self.worker_id, "expires_at": expires_at}}]
+                )
+                if claimed is not None:
+                    owned.add(doc["_id"])
+                    self._stats["claimed"] += 1
+
+        self._set_owned(owned)
+        self._stats["heartbeats"] += 1
+
+    async def _run(self):
+        while True:
+            try:
+                await self.heartbeat()
+            except Exception as e:
+                self._stats["errors"] += 1
+                print(f"Lease heartbeat failed: {e}")
+            await asyncio.sleep(self.heartbeat_seconds)
+
+    async def start(self):
+        """Create the shard documents, take a first share and keep heartbeating"""
+        await self._ensure_shards()
+        await self.heartbeat()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Stop heartbeating and hand every shard back"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._valid_until = 0.0
+        try:
+            await self.leases.update_many(
+                {"owner": self.worker_id}, [{"$set": {"owner": None, "expires_at": "$$NOW"}}]
+            )
+            await self.workers.delete_one({"_id": self.worker_id})
+        except Exception as e:
+            print(f"Error releasing leases: {e}")
+        self._lost(self.owned)
+        self._set_owned(set())
+
+    def stats(self) -> dict:
+        return {**self._stats, "worker": self.worker_id, "owned": len(self.owned), "shards": self.shards}
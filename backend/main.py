@@ -1,20 +1,60 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from typing import Dict, Optional, List
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, List, Union
 from datetime import datetime
-from urllib.parse import urlparse
-import requests
+import http_client
+import database
+import mongo
+from cache import TTLCache
+from pubsub import Broadcaster
+from persistence import StoreJournal
+from scheduler import AdaptiveScheduler
+from write_buffer import WriteBuffer
+from flapping import FlapDetector
+from alerts import AlertDispatcher
+from store import SiteStore, SiteRecord, STATUSES, STATUS_UP, STATUS_DOWN, TRAFFIC_LABELS
+from model import AnalyticsData
+import asyncio
+import json
+import os
 import time
-import ssl
-import socket
+import uuid
 import logging
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Simple Website Monitor", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Shared keep-alive HTTP pools live as long as the app
+    await http_client.startup()
+    # Index bootstrap runs in the background - the registry API doesn't need Mongo to start serving
+    tasks = [asyncio.create_task(database.initialize_database())]
+    if STORE_PERSIST:
+        restored = await asyncio.to_thread(journal.load)
+        print(f"Restored {restored} websites from {journal.directory}")
+        journal.start()
+    tasks.append(asyncio.create_task(publish_stats_snapshots()))
+    if STREAM_FROM_MONGO:
+        tasks.append(asyncio.create_task(relay_checker_updates()))
+    if EMBEDDED_CHECKER:
+        checker_task = start_embedded_checker()
+    yield
+    if EMBEDDED_CHECKER:
+        await stop_embedded_checker(checker_task)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    if STORE_PERSIST:
+        await journal.close()
+    await http_client.shutdown()
+    mongo.close()
+
+app = FastAPI(title="Simple Website Monitor", version="1.0.0", lifespan=lifespan)
 
 # Enable CORS
 app.add_middleware(
@@ -22,7 +62,8 @@ app.add_middleware(
     allow_origins=["*"], 
     allow_credentials=True, 
     allow_methods=["*"], 
-    allow_headers=["*"]
+    allow_headers=["*"],
+    expose_headers=["ETag", "X-Store-Version"]
 )
 
 # ---------- Data Models ----------
@@ -42,72 +83,195 @@ class WebsiteStatus(BaseModel):
     ssl_expiry_days: Optional[int] = Field(default=None, description="Days until SSL certificate expires")
     ssl_status: Optional[str] = Field(default=None, description="SSL certificate status")
 
+class WebsitesDelta(BaseModel):
+    version: str = Field(description="Pass back as ?since= for the next delta")
+    full: bool = Field(default=False, description="True when changes since the requested version are no longer known and changed holds every site")
+    changed: List[WebsiteStatus]
+    deleted: List[str]
+
 # ---------- In-Memory Storage ----------
-websites: Dict[str, WebsiteStatus] = {}
+# Compact records (see store.py); WebsiteStatus models are only built at the API boundary
+websites = SiteStore()
+
+# Background check-all jobs, oldest first
+check_jobs: Dict[str, dict] = {}
+
+# ---------- Settings ----------
+CHECK_ALL_CONCURRENCY = int(os.getenv("CHECK_ALL_CONCURRENCY", "50"))
+MAX_CHECK_JOBS = int(os.getenv("MAX_CHECK_JOBS", "20"))
+STREAM_STATS_SECONDS = float(os.getenv("STREAM_STATS_SECONDS", "10"))
+STREAM_HEARTBEAT_SECONDS = float(os.getenv("STREAM_HEARTBEAT_SECONDS", "15"))
+STREAM_FROM_MONGO = os.getenv("STREAM_FROM_MONGO", "false").lower() == "true"
+STORE_PERSIST = os.getenv("STORE_PERSIST", "true").lower() == "true"
+# Probe the registry on a schedule inside the app instead of a separate status_checker process
+EMBEDDED_CHECKER = os.getenv("EMBEDDED_CHECKER", "false").lower() == "true"
+EMBEDDED_CHECKER_HISTORY = os.getenv("EMBEDDED_CHECKER_HISTORY", "true").lower() == "true"
+CHECK_INTERVAL_SECONDS = int(os.getenv("CHECK_INTERVAL_MINUTES", "2")) * 60
+
+# Snapshot + change log under STORE_DIR so the registry survives restarts
+journal = StoreJournal(websites)
+
+# Embedded checker state, created in the lifespan when EMBEDDED_CHECKER is on
+scheduler: Optional[AdaptiveScheduler] = None
+history_buffer: Optional[WriteBuffer] = None
+flaps: Optional[FlapDetector] = None
+alerts: Optional[AlertDispatcher] = None
+
+# Fans status events out to /api/stream clients
+broadcaster = Broadcaster()
+
+# Composed analytics responses keyed by (name, hours)
+analytics_cache = TTLCache(
+    maxsize=int(os.getenv("ANALYTICS_CACHE_SIZE", "256")),
+    ttl=float(os.getenv("ANALYTICS_CACHE_TTL_SECONDS", "60"))
+)
+# Embedded-checker sites have no status doc, so their cache marker is how many
+# history batches the buffer has flushed for them
+history_flushes = {}
+
+def note_history_flushed(rows: list):
+    for name in {row["name"] for row in rows}:
+        history_flushes[name] = history_flushes.get(name, 0) + 1
 
 # ---------- Utility Functions ----------
 
-def extract_hostname(url: str) -> Optional[str]:
-    try:
-        parsed = urlparse(url if url.startswith("http") else f"https://{url}")
-        return parsed.hostname
-    except Exception as e:
-        print(f"Error parsing URL {url}: {e}")
-        return None
+def to_model(record: SiteRecord) -> WebsiteStatus:
+    return WebsiteStatus(
+        name=record.name,
+        url=record.url,
+        status=STATUSES[record.status],
+        response_time=record.response_time,
+        status_code=record.status_code,
+        traffic_info=TRAFFIC_LABELS[record.traffic],
+        last_checked=time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(record.last_checked)),
+        ssl_expiry_days=record.ssl_expiry_days
+    )
+
+def publish_change(record: SiteRecord):
+    if STORE_PERSIST:
+        journal.log_put(record)
+    if broadcaster.has_subscribers:
+        broadcaster.publish({"type": "status", "version": websites.version, "site": to_model(record).model_dump()})
 
-def check_website_status(url: str) -> tuple:
+def publish_deleted(name: str):
+    if STORE_PERSIST:
+        journal.log_delete(name)
+    if broadcaster.has_subscribers:
+        broadcaster.publish({"type": "deleted", "version": websites.version, "name": name})
+
+def etag_for(kind: str) -> str:
+    # The epoch in the token keeps a pre-restart ETag from matching different content at a reused version
+    return f'W/"{kind}-{websites.token}"'
+
+def not_modified(request: Request, etag: str) -> bool:
+    return etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]
+
+async def check_website_status(url: str) -> tuple:
+    """Probe a website, returns (status, response_time, status_code, ssl_expiry_days)"""
     if not url.startswith(("http://", "https://")):
         url = "https://" + url
 
-    start = time.time()
-    try:
-        response = requests.get(
-            url,
-            timeout=10,
-            headers={"User-Agent": "Mozilla/5.0 (Website Monitor)"},
-            allow_redirects=True
-        )
-        response_time = time.time() - start
-        status_code = int(response.status_code or 0)
-        status = "UP" if 200 <= status_code < 400 else "DOWN"
-        return status, response_time, status_code
-    except Exception as e:
-        print(f"Error checking {url}: {e}")
-        return "DOWN", time.time() - start, 0
-
-def get_traffic_info(response_time: float, status: str) -> str:
-    if status == "DOWN":
-        return "Server Down or Unreachable"
-    if response_time < 0.5:
-        return "Fast Response (Low Traffic)"
-    if response_time < 1.5:
-        return "Good Response (Normal Traffic)"
-    if response_time < 3.0:
-        return "Slow Response (High Traffic)"
-    return "Very Slow (Heavy Traffic or Server Issues)"
-
-def get_ssl_expiry_days(hostname: str) -> Optional[int]:
-    if not hostname:
+    result = await http_client.get_engine().probe_detailed(url)
+    status = STATUS_UP if result["status"] == "UP" else STATUS_DOWN
+    return status, result["response_time"], int(result["status_code"] or 0), result["ssl_expiry_days"]
+
+# ---------- Embedded Checker ----------
+
+def checker_status(record: SiteRecord) -> str:
+    """Status label as status_checker writes it to history"""
+    if not record.last_checked:
+        return "Checking"
+    return "UP" if record.status == STATUS_UP else "Down"
+
+def scheduled_site(record: SiteRecord) -> dict:
+    return {"name": record.name, "url": record.url, "current_status": checker_status(record)}
+
+async def probe_scheduled_site(site: dict) -> Optional[str]:
+    """Scheduled probe - the result is in the store (and on the stream) as soon as it arrives
+
+    Results go through the same confirmation, status_change rows and alerts as
+    status_checker: the store only shows confirmed transitions.
+    """
+    record = websites.get(site["name"])
+    if record is None:
         return None
-    
-    try:
-        context = ssl.create_default_context()
-        with socket.create_connection((hostname, 443), timeout=10) as sock:
-            with context.wrap_socket(sock, server_hostname=hostname) as ssock:
-                cert = ssock.getpeercert()
-        
-        if not cert or "notAfter" not in cert:
-            print(f"[SSL] No certificate found for {hostname}")
-            return None
-            
-        expiry = datetime.strptime(cert["notAfter"], "%b %d %H:%M:%S %Y %Z")
-        days_left = (expiry - datetime.utcnow()).days
-        print(f"[SSL] {hostname} SSL expires in {days_left} days")
-        return days_left
-    except Exception as e:
-        print(f"[SSL ERROR] {hostname}: {e}")
+    status, rt, code, ssl_days = await check_website_status(record.url)
+    if websites.get(record.name) is not record:  # deleted (or re-added) while we probed
         return None
 
+    name, url = record.name, record.url
+    probe_status = "UP" if status == STATUS_UP else "Down"
+    old_status, confirmed, flap_event = flaps.observe(name, probe_status, checker_status(record))
+    if websites.record_result(record, STATUS_UP if confirmed == "UP" else STATUS_DOWN, rt, code, ssl_days):
+        publish_change(record)
+    changed = old_status is not None and old_status != confirmed
+
+    if history_buffer is not None:
+        history_buffer.add_history({
+            "name": name,
+            "url": url,
+            "status": probe_status,
+            "response_time": rt,
+            "status_code": code,
+            "checked_at": datetime.utcnow()
+        })
+        if changed:
+            history_buffer.add_history({
+                "name": name,
+                "event_type": "status_change",
+                "old_status": old_status,
+                "new_status": confirmed,
+                "changed_at": datetime.utcnow()
+            })
+
+    if changed:
+        print(f"Status change detected for {name}: {old_status} → {confirmed}")
+        if not flaps.is_flapping(name):
+            alerts.enqueue(name, url, old_status, confirmed)
+    if flap_event == "flapping":
+        print(f"{name} is flapping - holding back alerts")
+        alerts.enqueue(name, url, confirmed, "Flapping")
+    elif flap_event == "stable":
+        print(f"{name} stopped flapping, now {confirmed}")
+        alerts.enqueue(name, url, "Flapping", confirmed)
+    return confirmed
+
+def start_embedded_checker() -> asyncio.Task:
+    """Schedule every site in the store, returns the scheduler task"""
+    global scheduler, history_buffer, flaps, alerts
+    if EMBEDDED_CHECKER_HISTORY:
+        # Same history rows (and rollups) as status_checker, so the analytics endpoints keep working
+        if database.HISTORY_BACKEND == "columnar":
+            import tsstore
+            history_buffer = WriteBuffer(database.collection, tsstore.history_store,
+                                         on_history_written=note_history_flushed)
+        else:
+            history_buffer = WriteBuffer(database.collection, database.history, database.analytics_collection,
+                                         on_history_written=note_history_flushed)
+        history_buffer.start()
+    flaps = FlapDetector()
+    alerts = AlertDispatcher()
+    alerts.start()
+    # Unconfirmed transitions get a quick re-probe, as in status_checker
+    scheduler = AdaptiveScheduler(probe_scheduled_site, default_interval=CHECK_INTERVAL_SECONDS, confirm=flaps.pending)
+    scheduler.sync_sites([scheduled_site(record) for record in websites.records.values()])
+    print(f"Embedded checker scheduling {len(websites)} websites (default interval {CHECK_INTERVAL_SECONDS}s)")
+    return asyncio.create_task(scheduler.run())
+
+async def stop_embedded_checker(task: asyncio.Task):
+    """No new probes, let the in-flight ones land, then send their alerts and write out their history"""
+    global scheduler, history_buffer, flaps, alerts
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    await scheduler.stop()
+    scheduler = None
+    await alerts.close()
+    alerts = None
+    flaps = None
+    if history_buffer is not None:
+        await history_buffer.close()
+        history_buffer = None
+
 # ---------- API Endpoints ----------
 
 @app.get("/")
@@ -119,70 +283,76 @@ def read_root():
             "get_all": "GET /api/websites",
             "check_one": "GET /api/check/{name}",
             "delete": "DELETE /api/websites/{name}",
-            "check_all": "POST /api/check-all",
-            "stats": "GET /api/stats"
+            "check_all": "POST /api/check-all?mode=batch|stream|job",
+            "check_all_job": "GET /api/check-all/{job_id}",
+            "stats": "GET /api/stats",
+            "probe_stats": "GET /api/probe-stats",
+            "checker_stats": "GET /api/checker-stats (EMBEDDED_CHECKER=true)",
+            "analytics": "GET /api/analytics/{name}/complete?hours=24",
+            "stream": "GET /api/stream (server-sent events)"
         }
     }
 
 @app.post("/api/websites", response_model=WebsiteStatus)
-def add_website(website: Website):
+async def add_website(website: Website):
     if website.name in websites:
         raise HTTPException(400, f"Website '{website.name}' already exists")
     try:
-        status, rt, code = check_website_status(website.url)
-        traffic = get_traffic_info(rt, status)
-
-        hostname = extract_hostname(website.url)
-        ssl_days = None
-        if hostname and website.url.startswith("https://"):
-            ssl_days = get_ssl_expiry_days(hostname)
-
-        ws = WebsiteStatus(
-            name=website.name,
-            url=website.url,
-            status=status,
-            response_time=round(rt, 3),
-            status_code=code,
-            traffic_info=traffic,
-            last_checked=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            ssl_expiry_days=ssl_days
-        )
-        websites[website.name] = ws
+        # SSL expiry comes from the same TLS session as the HTTP probe
+        status, rt, code, ssl_days = await check_website_status(website.url)
+        if website.name in websites:  # added by a concurrent request while we probed
+            raise HTTPException(400, f"Website '{website.name}' already exists")
+
+        record = websites.add(website.name, website.url)
+        websites.record_result(record, status, rt, code, ssl_days)
+        publish_change(record)
+        if scheduler is not None:
+            scheduler.add_site(scheduled_site(record))
+        ws = to_model(record)
         print(f"[DEBUG] Added website: {ws.model_dump()}")  # Debug output
         return ws
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error adding website {website.name}: {e}")
         raise HTTPException(500, f"Failed to add website: {e}")
 
-@app.get("/api/websites", response_model=List[WebsiteStatus])
-def get_all_websites():
-    result = list(websites.values())
-    print(f"[DEBUG] Returning {len(result)} websites")  # Debug output
-    for site in result:
-        print(f"[DEBUG] Site: {site.name}, SSL Days: {site.ssl_expiry_days}")
-    return result
+@app.get("/api/websites", response_model=Union[List[WebsiteStatus], WebsitesDelta])
+def get_all_websites(request: Request, response: Response, since: Optional[str] = None):
+    """All websites, or with ?since=<version> only the ones changed or deleted after that version
+
+    Responses carry an ETag (and X-Store-Version); a matching If-None-Match gets a 304.
+    Versions are "<epoch>.<n>" tokens - one from before a restart gets full=true.
+    """
+    etag = etag_for("websites")
+    headers = {"ETag": etag, "X-Store-Version": websites.token}
+    if not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+
+    if since is None:
+        return [to_model(record) for record in websites.records.values()]
+
+    full, changed, deleted = websites.changes_since(since)
+    return WebsitesDelta(
+        version=websites.token,
+        full=full,
+        changed=[to_model(record) for record in changed],
+        deleted=deleted
+    )
 
 @app.get("/api/check/{name}", response_model=WebsiteStatus)
-def check_single_website(name: str):
-    if name not in websites:
+async def check_single_website(name: str):
+    record = websites.get(name)
+    if record is None:
         raise HTTPException(404, f"Website '{name}' not found")
     try:
-        current = websites[name]
-        status, rt, code = check_website_status(current.url)
-        traffic = get_traffic_info(rt, status)
-
-        hostname = extract_hostname(current.url)
-        ssl_days = None
-        if hostname and current.url.startswith("https://"):
-            ssl_days = get_ssl_expiry_days(hostname)
-
-        current.status = status
-        current.response_time = round(rt, 3)
-        current.status_code = code
-        current.traffic_info = traffic
-        current.last_checked = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        current.ssl_expiry_days = ssl_days
+        # SSL expiry comes from the same TLS session as the HTTP probe
+        status, rt, code, ssl_days = await check_website_status(record.url)
+        if websites.record_result(record, status, rt, code, ssl_days):
+            publish_change(record)
 
+        current = to_model(record)
         print(f"[DEBUG] Updated website: {current.model_dump()}")  # Debug output
         return current
     except Exception as e:
@@ -191,44 +361,199 @@ def check_single_website(name: str):
 
 @app.delete("/api/websites/{name}")
 def delete_website(name: str):
-    if name not in websites:
+    if websites.remove(name) is None:
         raise HTTPException(404, f"Website '{name}' not found")
-    del websites[name]
+    publish_deleted(name)
+    if scheduler is not None:
+        scheduler.remove_site(name)
+        flaps.retain(websites.names())
     return {"message": f"Website '{name}' deleted successfully"}
 
+async def _check_for_batch(name: str) -> dict:
+    try:
+        data = await check_single_website(name)
+        return {"name": name, "status": "success", "data": data}
+    except Exception as e:
+        return {"name": name, "status": "error", "error": str(e)}
+
+async def iter_check_results(names: List[str]):
+    """Check sites in parallel (bounded by CHECK_ALL_CONCURRENCY), yielding results as they finish"""
+    semaphore = asyncio.Semaphore(CHECK_ALL_CONCURRENCY)
+
+    async def bounded(name):
+        async with semaphore:
+            return await _check_for_batch(name)
+
+    for next_result in asyncio.as_completed([bounded(name) for name in names]):
+        yield await next_result
+
+async def _run_check_job(job: dict, names: List[str]):
+    async for result in iter_check_results(names):
+        job["results"].append(result)
+        job["completed"] += 1
+    job["state"] = "done"
+    job["finished_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+def _start_check_job(names: List[str]) -> dict:
+    # Forget the oldest finished jobs so the registry stays bounded
+    for job_id in list(check_jobs):
+        if len(check_jobs) < MAX_CHECK_JOBS:
+            break
+        if check_jobs[job_id]["state"] == "done":
+            del check_jobs[job_id]
+
+    job = {
+        "job_id": uuid.uuid4().hex,
+        "state": "running",
+        "total": len(names),
+        "completed": 0,
+        "results": [],
+        "started_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "finished_at": None
+    }
+    check_jobs[job["job_id"]] = job
+    job["_task"] = asyncio.create_task(_run_check_job(job, names))
+    return job
+
 @app.post("/api/check-all")
-def check_all_websites():
-    results = []
-    for name in list(websites):
-        try:
-            data = check_single_website(name)
-            results.append({"name": name, "status": "success", "data": data})
-        except Exception as e:
-            results.append({"name": name, "status": "error", "error": str(e)})
-    return {"message": f"Checked {len(websites)} websites", "results": results}
+async def check_all_websites(mode: str = "batch"):
+    """Check every website in parallel
+
+    mode=batch waits for all results, mode=stream sends each result as an
+    NDJSON line when it finishes, mode=job returns a job handle to poll.
+    """
+    names = websites.names()
+
+    if mode == "stream":
+        async def ndjson():
+            async for result in iter_check_results(names):
+                if "data" in result:
+                    result["data"] = result["data"].model_dump()
+                yield json.dumps(result) + "\n"
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+    if mode == "job":
+        job = _start_check_job(names)
+        return {"job_id": job["job_id"], "total": job["total"], "poll": f"/api/check-all/{job['job_id']}"}
+
+    if mode != "batch":
+        raise HTTPException(400, f"Unknown mode '{mode}', use batch, stream or job")
+
+    results = [result async for result in iter_check_results(names)]
+    return {"message": f"Checked {len(names)} websites", "results": results}
+
+@app.get("/api/check-all/{job_id}")
+def get_check_all_job(job_id: str):
+    if job_id not in check_jobs:
+        raise HTTPException(404, f"Job '{job_id}' not found")
+    job = check_jobs[job_id]
+    return {key: value for key, value in job.items() if not key.startswith("_")}
 
 @app.get("/api/stats")
-def get_stats():
-    total = len(websites)
-    up = sum(1 for w in websites.values() if w.status == "UP")
-    down = total - up
-    avg = (
-        round(sum(w.response_time for w in websites.values() if w.status == "UP") / up, 3)
-        if up > 0
-        else 0
+def get_stats(request: Request, response: Response, breakdown: bool = False):
+    """Fleet stats; ?breakdown=true adds counts per status code class and traffic bucket"""
+    etag = etag_for("stats-breakdown" if breakdown else "stats")
+    if not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return compute_stats(breakdown)
+
+def compute_stats(breakdown: bool = False) -> dict:
+    """O(1) - reads the incrementally maintained counters"""
+    return websites.counters.snapshot(breakdown)
+
+@app.get("/api/analytics/{name}/complete", response_model=AnalyticsData)
+async def get_complete_analytics(name: str, hours: int = Query(default=24, ge=1, le=168)):
+    """History, uptime, response times and hourly trend for one site
+
+    Results are cached per (name, hours). A cached entry is only served while
+    the site's last_updated is unchanged, so new checks show up immediately.
+    Sites checked by the embedded checker use their flushed history batch count.
+    """
+    marker = await database.get_history_marker(name)
+    if marker is None:
+        marker = history_flushes.get(name)
+    cached = analytics_cache.get((name, hours), marker)
+    if cached is not None:
+        return cached
+
+    history, uptime, response_times, trends = await asyncio.gather(
+        database.get_status_history(name, hours),
+        database.get_uptime_analytics(name, hours),
+        database.get_response_time_analytics(name, hours),
+        database.get_hourly_status_trend(name, hours)
+    )
+    result = AnalyticsData(
+        name=name,
+        uptime_analytics=uptime,
+        response_time_analytics=response_times,
+        hourly_trends=trends,
+        history=history
     )
-    
-    # SSL certificate stats
-    ssl_expiring_soon = sum(1 for w in websites.values() if w.ssl_expiry_days is not None and w.ssl_expiry_days <= 30)
-    ssl_expired = sum(1 for w in websites.values() if w.ssl_expiry_days is not None and w.ssl_expiry_days <= 0)
-    
+    analytics_cache.set((name, hours), result, marker)
+    return result
+
+# ---------- Push Stream ----------
+
+def format_sse(event: dict) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+@app.get("/api/stream")
+async def stream_events():
+    """Server-sent events: status changes, deletions and periodic stats snapshots"""
+    subscriber = broadcaster.subscribe()
+
+    async def events():
+        try:
+            # Start every client from a consistent snapshot
+            yield format_sse({"type": "stats", "version": websites.version, "stats": compute_stats()})
+            while not subscriber.closed:
+                event = await subscriber.next_event(STREAM_HEARTBEAT_SECONDS)
+                # Comment lines keep idle connections (and proxies) alive
+                yield format_sse(event) if event is not None else ": keep-alive\n\n"
+        finally:
+            broadcaster.unsubscribe(subscriber)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+async def publish_stats_snapshots():
+    while True:
+        await asyncio.sleep(STREAM_STATS_SECONDS)
+        if broadcaster.has_subscribers:
+            broadcaster.publish({"type": "stats", "version": websites.version, "stats": compute_stats()})
+
+async def relay_checker_updates():
+    """Forward status transitions written by status_checker (Mongo change streams need a replica set)"""
+    pipeline = [{"$match": {"$or": [
+        {"operationType": "insert"},
+        {"updateDescription.updatedFields.status": {"$exists": True}}
+    ]}}]
+    try:
+        async with database.collection.watch(pipeline, full_document="updateLookup") as stream:
+            async for change in stream:
+                document = change.get("fullDocument")
+                if document and broadcaster.has_subscribers:
+                    broadcaster.publish({"type": "checker_status", "site": database.fix_mongo_id(document)})
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        print(f"Mongo change stream stopped: {e}")
+
+@app.get("/api/probe-stats")
+def get_probe_stats():
+    """Cold (new connection) vs warm (pooled) probe timings, see PROBE_MEASURE_COLD"""
+    return http_client.get_engine().timing_stats()
+
+@app.get("/api/checker-stats")
+def get_checker_stats():
+    """Embedded checker queue depth, dispatch lag and history buffer"""
+    if scheduler is None:
+        raise HTTPException(404, "Embedded checker is not running, set EMBEDDED_CHECKER=true")
     return {
-        "total_websites": total,
-        "websites_up": up,
-        "websites_down": down,
-        "average_response_time": avg,
-        "ssl_expiring_soon": ssl_expiring_soon,
-        "ssl_expired": ssl_expired
+        "scheduler": scheduler.metrics(),
+        "history": history_buffer.stats() if history_buffer is not None else None,
+        "flaps": flaps.stats(),
+        "alerts": alerts.stats()
     }
 
 # ---------- Run App ----------
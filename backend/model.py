@@ -40,6 +40,9 @@ class ResponseTimeAnalytics(BaseModel):
     avg_response_time: float
     min_response_time: float
     max_response_time: float
+    p50_response_time: float = 0
+    p95_response_time: float = 0
+    p99_response_time: float = 0
     total_measurements: int
 
 class HourlyTrend(BaseModel):
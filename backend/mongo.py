@@ -0,0 +1,154 @@
+import os
+from datetime import datetime, timedelta
+import motor.motor_asyncio
+from pymongo.errors import OperationFailure
+from dotenv import load_dotenv
+from partitions import HistoryPartitions
+from rollups import window_filter
+
+load_dotenv()
+
+# One client per process, shared by database.py, status_checker.py and webcheck.py
+DB_URL = os.getenv("DB_URL", "mongodb://localhost:27017")
+DB_NAME = os.getenv("DB_NAME", "StatusList")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_TIMEOUT_MS = int(os.getenv("MONGO_TIMEOUT_MS", "5000"))
+
+_client = None
+
+def get_client() -> motor.motor_asyncio.AsyncIOMotorClient:
+    """The shared client, created on first use"""
+    global _client
+    if _client is None:
+        _client = motor.motor_asyncio.AsyncIOMotorClient(
+            DB_URL,
+            maxPoolSize=MONGO_MAX_POOL_SIZE,
+            minPoolSize=MONGO_MIN_POOL_SIZE,
+            serverSelectionTimeoutMS=MONGO_TIMEOUT_MS
+        )
+    return _client
+
+def get_database():
+    return get_client()[DB_NAME]
+
+def close():
+    """Close the shared client; the next use opens a new one"""
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
+
+class LazyCollection:
+    """Stands in for a motor collection so importing a module never opens a client"""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __getattr__(self, attr):
+        return getattr(get_database()[self.name], attr)
+
+class LazyDatabase:
+    """database[name] gives a LazyCollection, everything else goes to the real database"""
+
+    def __getitem__(self, name: str) -> LazyCollection:
+        return LazyCollection(name)
+
+    def __getattr__(self, attr):
+        return getattr(get_database(), attr)
+
+database = LazyDatabase()
+
+def collection(name: str) -> LazyCollection:
+    return LazyCollection(name)
+
+# ---------- Startup ----------
+
+async def _ensure_unique_name(status):
+    """Unique index on status.name - the name index is never dropped before its replacement exists"""
+    indexes = await status.index_information()
+    plain = "name_1" in indexes and not indexes["name_1"].get("unique")
+    if any(spec["key"] == [("name", 1)] and spec.get("unique") for spec in indexes.values()):
+        if plain:  # left behind by a swap that stopped halfway
+            await status.drop_index("name_1")
+        return
+    if not plain:
+        await status.create_index([("name", 1)], unique=True)
+        return
+    # Older deployments have a non-unique name_1 - build the unique one next to it, then drop name_1
+    try:
+        await status.create_index([("name", 1)], unique=True, name="name_unique")
+    except OperationFailure as e:
+        if e.code not in (85, 86):
+            raise  # e.g. duplicate names - name_1 stays
+        # This server allows one index per key pattern: only swap when the build can't fail
+        duplicates = await status.aggregate([
+            {"$group": {"_id": "$name", "count": {"$sum": 1}}},
+            {"$match": {"count": {"$gt": 1}}},
+            {"$limit": 1}
+        ]).to_list(length=1)
+        if duplicates:
+            raise OperationFailure(f"duplicate name {duplicates[0]['_id']!r}, keeping the non-unique name_1")
+        await status.drop_index("name_1")
+        try:
+            await status.create_index([("name", 1)], unique=True)
+        except OperationFailure:
+            await status.create_index([("name", 1)])  # put the plain index back
+            raise
+        return
+    await status.drop_index("name_1")
+
+async def ensure_indexes():
+    """Create the indexes the query helpers rely on (idempotent)"""
+    try:
+        await _ensure_unique_name(database["status"])
+    except OperationFailure as e:
+        print(f"Could not create unique index on status.name (duplicate names?): {e}")
+
+    # status_history (or the current partition), including its retention TTL when unpartitioned
+    history = HistoryPartitions(database)
+    await history.ensure_indexes(history.name_for(datetime.utcnow()))
+
+    # Rollups: one document per (site, granularity, bucket), expired by TTL
+    analytics = database["analytics"]
+    await analytics.create_index([("name", 1), ("granularity", 1), ("bucket", 1)], unique=True)
+    await analytics.create_index([("expire_at", 1)], expireAfterSeconds=0)
+
+def _has_collscan(plan) -> bool:
+    if isinstance(plan, dict):
+        if plan.get("stage") == "COLLSCAN":
+            return True
+        return any(_has_collscan(value) for value in plan.values())
+    if isinstance(plan, list):
+        return any(_has_collscan(value) for value in plan)
+    return False
+
+async def check_query_plans() -> list:
+    """Explain the hot query shapes and warn about any that would scan a whole collection"""
+    since = datetime.utcnow() - timedelta(hours=24)
+    history = HistoryPartitions(database)
+    shapes = {
+        "status by name": database["status"].find({"name": "_probe"}),
+        "history window": database[history.name_for(datetime.utcnow())]
+            .find({"name": "_probe", "checked_at": {"$gte": since}}).sort("checked_at", -1),
+        "rollup window": database["analytics"].find(window_filter("_probe", since))
+    }
+    scans = []
+    for label, cursor in shapes.items():
+        plan = await cursor.explain()
+        if _has_collscan(plan.get("queryPlanner", plan)):
+            scans.append(label)
+            print(f"WARNING: query '{label}' uses a collection scan - check its indexes")
+    return scans
+
+async def bootstrap():
+    """Indexes + plan check, for entry points to run at startup"""
+    try:
+        await ensure_indexes()
+        print("Database indexes verified")
+    except Exception as e:
+        print(f"Error preparing database indexes: {e}")
+    try:
+        await check_query_plans()
+    except Exception as e:
+        print(f"Error checking query plans: {e}")
@@ -0,0 +1,256 @@
+import asyncio
+import bisect
+import hashlib
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from multiprocessing.connection import wait
+from urllib.parse import urlsplit
+
+# Probe worker processes (RUN_MODE=multicore)
+MULTICORE_WORKERS = int(os.getenv("MULTICORE_WORKERS", "0")) or os.cpu_count() or 1
+MULTICORE_RING_REPLICAS = int(os.getenv("MULTICORE_RING_REPLICAS", "100"))  # virtual nodes per worker
+MULTICORE_SUPERVISE_SECONDS = float(os.getenv("MULTICORE_SUPERVISE_SECONDS", "5"))
+
+class ProbePoolError(RuntimeError):
+    """The pool failed to get a result (worker died, channel broken) - says nothing about the site"""
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+class HashRing:
+    """Consistent hash ring - a host keeps its worker (and its warm connections) across restarts"""
+
+    def __init__(self, nodes: list, replicas: int = MULTICORE_RING_REPLICAS):
+        ring = sorted((_hash(f"{node}:{replica}"), node) for node in nodes for replica in range(replicas))
+        self._keys = [key for key, _ in ring]
+        self._nodes = [node for _, node in ring]
+
+    def node_for(self, key: str):
+        index = bisect.bisect(self._keys, _hash(key)) % len(self._keys)
+        return self._nodes[index]
+
+# ---------- Worker process ----------
+
+def _worker_main(index: int, requests, results):
+    asyncio.run(_serve(index, requests, results))
+
+async def _serve(index: int, requests, results):
+    """Probe URLs from `requests` on this process's own event loop and ProbeEngine"""
+    import http_client
+
+    await http_client.startup()
+    engine = http_client.get_engine()
+    loop = asyncio.get_running_loop()
+    parent = multiprocessing.parent_process()
+    tasks = set()
+
+    # Results go out through a thread so a slow parent never blocks the event loop
+    outbox = queue.SimpleQueue()
+
+    def send_results():
+        while True:
+            item = outbox.get()
+            if item is None:
+                return
+            results.send(item)
+
+    sender = threading.Thread(target=send_results, daemon=True)
+    sender.start()
+
+    async def probe(request_id: int, url: str):
+        try:
+            status, response_time, status_code = await engine.probe(url)
+            outbox.put((request_id, status, response_time, status_code, None))
+        except Exception as e:
+            outbox.put((request_id, None, None, None, repr(e)))
+
+    def next_request():
+        # Wake up every second to notice a parent that died without saying goodbye
+        while True:
+            try:
+                return requests.get(timeout=1)
+            except queue.Empty:
+                if parent is not None and not parent.is_alive():
+                    return None
+
+    try:
+        while True:
+            request = await loop.run_in_executor(None, next_request)
+            if request is None:
+                break
+            task = asyncio.create_task(probe(*request))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        outbox.put(None)
+        await asyncio.to_thread(sender.join)
+        results.close()
+        await http_client.shutdown()
+
+# ---------- Parent side ----------
+
+class ProbePool:
+    """Probes spread over one event loop per core
+
+    Each worker process runs its own ProbeEngine, so TLS handshakes and
+    response parsing use every core. probe(url) has the same signature and
+    result as ProbeEngine.probe. The URL's host is routed to a worker through
+    a consistent hash ring, so each host's keep-alive pool lives in one
+    worker, and the result comes back to the parent, which stays the single
+    writer (scheduler, flap detection, write buffer, alerts).
+
+    Every worker has its own request queue and result pipe - a worker that is
+    killed mid-write can only break its own channels. Dead workers are
+    restarted in place with fresh channels; their outstanding probes fail with
+    ProbePoolError.
+    """
+
+    def __init__(self, workers: int = MULTICORE_WORKERS):
+        self.workers = workers
+        self._context = multiprocessing.get_context("spawn")
+        self._ring = HashRing(list(range(workers)))
+        self._requests = [None] * workers
+        self._processes = [None] * workers
+        self._connections = {}  # result pipe -> worker index
+        self._lock = threading.Lock()
+        self._pending = {}  # request_id -> (future, worker index)
+        self._ids = itertools.count()
+        self._loop = None
+        self._reader = None
+        self._supervisor = None
+        self._stopping = False
+        self._stats = {"probes": 0, "restarts": 0, "failed": 0}
+
+    def _spawn(self, index: int):
+        requests = self._context.Queue()
+        receiver, sender = self._context.Pipe(duplex=False)
+        process = self._context.Process(
+            target=_worker_main, args=(index, requests, sender),
+            name=f"probe-worker-{index}", daemon=True
+        )
+        process.start()
+        sender.close()  # the worker holds the only write end, so its exit shows up as EOF
+        self._requests[index] = requests
+        self._processes[index] = process
+        with self._lock:
+            self._connections[receiver] = index
+
+    def _read_results(self):
+        # Blocking reads in a thread, results handed to the event loop
+        while not self._stopping:
+            with self._lock:
+                connections = list(self._connections)
+            if not connections:
+                time.sleep(0.1)
+                continue
+            for connection in wait(connections, timeout=0.5):
+                try:
+                    item = connection.recv()
+                except (EOFError, OSError):
+                    with self._lock:
+                        self._connections.pop(connection, None)
+                    connection.close()
+                    continue
+                self._loop.call_soon_threadsafe(self._resolve, item)
+
+    def _resolve(self, item: tuple):
+        request_id, status, response_time, status_code, error = item
+        future, _ = self._pending.pop(request_id, (None, None))
+        if future is None or future.done():
+            return
+        if error is not None:
+            future.set_exception(RuntimeError(error))
+        else:
+            future.set_result((status, response_time, status_code))
+
+    def _restart(self, index: int):
+        process = self._processes[index]
+        print(f"Probe worker {index} exited ({process.exitcode}), restarting")
+        self._stats["restarts"] += 1
+        for request_id, (future, worker) in list(self._pending.items()):
+            if worker == index:
+                del self._pending[request_id]
+                self._stats["failed"] += 1
+                if not future.done():
+                    future.set_exception(ProbePoolError(f"probe worker {index} died"))
+        # The old queue may be stuck on a lock the dead worker held - abandon it
+        self._requests[index].cancel_join_thread()
+        self._requests[index].close()
+        self._spawn(index)
+
+    async def _supervise(self):
+        while True:
+            await asyncio.sleep(MULTICORE_SUPERVISE_SECONDS)
+            for index, process in enumerate(self._processes):
+                if not process.is_alive():
+                    self._restart(index)
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._stopping = False
+        for index in range(self.workers):
+            self._spawn(index)
+        self._reader = threading.Thread(target=self._read_results, name="probe-results", daemon=True)
+        self._reader.start()
+        self._supervisor = asyncio.create_task(self._supervise())
+        print(f"Started {self.workers} probe worker processes")
+
+    async def probe(self, url: str) -> tuple:
+        index = self._ring.node_for(urlsplit(url).netloc or url)
+        request_id = next(self._ids)
+        future = self._loop.create_future()
+        self._pending[request_id] = (future, index)
+        try:
+            self._requests[index].put((request_id, url))
+        except (OSError, ValueError) as e:  # queue closed or broken
+            del self._pending[request_id]
+            raise ProbePoolError(f"probe worker {index} unreachable: {e}") from e
+        self._stats["probes"] += 1
+        return await future
+
+    def _drained(self) -> bool:
+        with self._lock:
+            return not self._connections
+
+    async def close(self, timeout: float = 15):
+        """Let workers finish their in-flight probes, then stop them"""
+        if self._supervisor is not None:
+            self._supervisor.cancel()
+            self._supervisor = None
+        for index, process in enumerate(self._processes):
+            if process is not None and process.is_alive():
+                self._requests[index].put(None)
+        for process in self._processes:
+            if process is not None:
+                await asyncio.to_thread(process.join, timeout)
+                if process.is_alive():
+                    process.terminate()
+        if self._reader is not None:
+            # Every pipe is read up to the worker's EOF before the reader stops
+            deadline = time.monotonic() + 5
+            while not self._drained() and time.monotonic() < deadline:
+                await asyncio.sleep(0.05)
+            self._stopping = True
+            await asyncio.to_thread(self._reader.join, 5)
+            self._reader = None
+        with self._lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections.clear()
+        for requests in self._requests:
+            if requests is not None:
+                requests.close()
+        for future, _ in self._pending.values():
+            if not future.done():
+                future.cancel()
+        self._pending.clear()
+
+    def stats(self) -> dict:
+        return {**self._stats, "workers": self.workers, "pending": len(self._pending),
+                "alive": sum(1 for process in self._processes if process is not None and process.is_alive())}
@@ -2,12 +2,20 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
+from contextlib import asynccontextmanager
 import requests
+import http_client
 import time
 from typing import Dict, List
 import asyncio
 
-app = FastAPI(title="Simple Website Monitor", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Release pooled connections on shutdown
+    await http_client.shutdown()
+
+app = FastAPI(title="Simple Website Monitor", version="1.0.0", lifespan=lifespan)
 
 # CORS
 app.add_middleware(
@@ -43,11 +51,8 @@ def check_website(url: str) -> WebsiteStatus:
     start_time = time.time()
     
     try:
-        # Make request with timeout
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Website Monitor Bot)'
-        }
-        response = requests.get(url, timeout=10, headers=headers, allow_redirects=True)
+        # Make request with timeout over the shared keep-alive pool
+        response = http_client.get_session().get(url, timeout=10, allow_redirects=True)
         response_time = time.time() - start_time
         
         # Determine status
@@ -0,0 +1,172 @@
+import asyncio
+import os
+import re
+from datetime import datetime, timedelta
+from pymongo.errors import BulkWriteError, OperationFailure
+
+# none = one status_history collection expired by a TTL index,
+# daily / weekly = one collection per period, dropped whole once it is past retention
+HISTORY_PARTITIONING = os.getenv("HISTORY_PARTITIONING", "none")
+HISTORY_RETENTION_DAYS = int(os.getenv("HISTORY_RETENTION_DAYS", "30"))
+
+PERIOD_LENGTH = {"daily": timedelta(days=1), "weekly": timedelta(days=7)}
+
+def partition_start(moment: datetime, period: str) -> datetime:
+    """Start of the day (or Monday of the week) containing moment"""
+    start = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    if period == "weekly":
+        start -= timedelta(days=start.weekday())
+    return start
+
+class HistoryPartitions:
+    """status_history, optionally split into time partitions
+
+    Partitions are named {prefix}_YYYYMMDD after the first day they cover and
+    hold every row whose checked_at (or changed_at for status change events)
+    falls in that period. Queries only touch partitions overlapping their
+    window, and retention drops whole collections instead of deleting rows.
+    Without partitioning everything maps to the base collection and retention
+    is a TTL index.
+    """
+
+    def __init__(self, database, prefix: str = "status_history", period: str = HISTORY_PARTITIONING,
+                 retention_days: int = HISTORY_RETENTION_DAYS):
+        if period not in ("none", *PERIOD_LENGTH):
+            raise ValueError(f"Unknown HISTORY_PARTITIONING '{period}'")
+        self.database = database
+        self.prefix = prefix
+        self.period = period
+        self.retention_days = retention_days
+        self._indexed = set()
+        self._pattern = re.compile(rf"^{re.escape(prefix)}_(\d{{8}})$")
+
+    @property
+    def partitioned(self) -> bool:
+        return self.period != "none"
+
+    # ---------- Routing ----------
+
+    def name_for(self, moment: datetime) -> str:
+        if not self.partitioned:
+            return self.prefix
+        return f"{self.prefix}_{partition_start(moment, self.period):%Y%m%d}"
+
+    def overlapping(self, since: datetime, until: datetime = None) -> list:
+        """Names of the partitions covering [since, until], newest first"""
+        if not self.partitioned:
+            return [self.prefix]
+        first = partition_start(since, self.period)
+        current = partition_start(until or datetime.utcnow(), self.period)
+        names = []
+        while current >= first:
+            names.append(f"{self.prefix}_{current:%Y%m%d}")
+            current -= PERIOD_LENGTH[self.period]
+        return names
+
+    async def existing(self) -> list:
+        """Every history collection currently in the database"""
+        names = await self.database.list_collection_names()
+        return [name for name in names if name == self.prefix or self._pattern.match(name)]
+
+    # ---------- Indexes ----------
+
+    async def _ensure_ttl(self, collection, field: str, seconds: int):
+        try:
+            await collection.create_index([(field, 1)], expireAfterSeconds=seconds)
+        except OperationFailure:
+            # Same key with a different expiry - retention was changed, update it in place
+            await self.database.command({
+                "collMod": collection.name,
+                "index": {"keyPattern": {field: 1}, "expireAfterSeconds": seconds}
+            })
+
+    async def ensure_indexes(self, name: str):
+        """Indexes for one history collection (once per process)"""
+        if name in self._indexed:
+            return
+        collection = self.database[name]
+        await collection.create_index([("name", 1), ("checked_at", -1)])
+        await collection.create_index([("name", 1), ("status", 1), ("checked_at", -1)])
+        # checked_at alone serves the all-sites window aggregation
+        if not self.partitioned:
+            seconds = self.retention_days * 86400
+            await self._ensure_ttl(collection, "checked_at", seconds)
+            await self._ensure_ttl(collection, "changed_at", seconds)  # status change events
+        else:
+            await collection.create_index([("checked_at", 1)])
+        self._indexed.add(name)
+
+    # ---------- Writes ----------
+
+    async def insert_many(self, documents: list, ordered: bool = False):
+        """Route each document to its partition (also serves as WriteBuffer's history collection)"""
+        groups = {}  # partition -> [(index in documents, document)]
+        for index, document in enumerate(documents):
+            moment = document.get("checked_at") or document["changed_at"]
+            groups.setdefault(self.name_for(moment), []).append((index, document))
+        # Every partition gets its rows even if another one rejects some, and rejected rows
+        # are reported by their index in `documents`, like a single insert_many would
+        errors, inserted = [], 0
+        for name, group in groups.items():
+            await self.ensure_indexes(name)
+            try:
+                await self.database[name].insert_many([document for _, document in group], ordered=ordered)
+                inserted += len(group)
+            except BulkWriteError as e:
+                group_errors = e.details.get("writeErrors", [])
+                errors.extend({**error, "index": group[error["index"]][0]} for error in group_errors)
+                inserted += e.details.get("nInserted", len(group) - len(group_errors))
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "writeConcernErrors": [], "nInserted": inserted})
+
+    async def insert_one(self, document: dict):
+        await self.insert_many([document])
+
+    async def delete_site(self, name: str):
+        collections = await self.existing()
+        await asyncio.gather(*(self.database[c].delete_many({"name": name}) for c in collections))
+
+    # ---------- Reads ----------
+
+    async def find_recent(self, query: dict, since: datetime, limit: int) -> list:
+        """Newest rows matching query with checked_at >= since, partitions scanned newest first"""
+        results = []
+        for name in self.overlapping(since):
+            cursor = self.database[name].find({**query, "checked_at": {"$gte": since}})
+            cursor = cursor.sort("checked_at", -1).limit(limit - len(results))
+            results.extend(await cursor.to_list(length=None))
+            if len(results) >= limit:
+                break
+        return results
+
+    async def aggregate_each(self, since: datetime, pipeline: list) -> list:
+        """Run pipeline on every partition overlapping the window, results concatenated"""
+        async def run(name):
+            return await self.database[name].aggregate(pipeline).to_list(length=None)
+        results = await asyncio.gather(*(run(name) for name in self.overlapping(since)))
+        return [item for items in results for item in items]
+
+    # ---------- Retention ----------
+
+    async def apply_retention(self) -> list:
+        """Drop partitions that ended before the retention cutoff, returns their names
+
+        Unpartitioned history is expired by its TTL index, so this only makes
+        sure that index exists with the current retention.
+        """
+        if not self.partitioned:
+            self._indexed.discard(self.prefix)
+            await self.ensure_indexes(self.prefix)
+            return []
+        cutoff = datetime.utcnow() - timedelta(days=self.retention_days)
+        dropped = []
+        for name in await self.existing():
+            match = self._pattern.match(name)
+            if match is None:
+                continue
+            start = datetime.strptime(match.group(1), "%Y%m%d")
+            if start + PERIOD_LENGTH[self.period] <= cutoff:
+                await self.database.drop_collection(name)
+                self._indexed.discard(name)
+                dropped.append(name)
+        return dropped
@@ -0,0 +1,159 @@
+import asyncio
+import json
+import os
+from store import SiteStore, SiteRecord
+
+# Local durability for main.py's registry
+STORE_DIR = os.getenv("STORE_DIR", "data")
+STORE_FSYNC_SECONDS = float(os.getenv("STORE_FSYNC_SECONDS", "1"))
+STORE_COMPACT_AFTER = int(os.getenv("STORE_COMPACT_AFTER", "100000"))  # log entries before a new snapshot
+
+class StoreJournal:
+    """Snapshot + append-only change log for a SiteStore
+
+    Every change is queued as one JSON line and written to the log with a
+    single write + fsync per STORE_FSYNC_SECONDS. Once STORE_COMPACT_AFTER
+    entries have accumulated the whole store is written to a fresh snapshot
+    (temp file + rename) and the log starts over. Startup loads the snapshot
+    and replays the log on top of it; a torn last line from a crash is skipped
+    and cut off the log.
+    """
+
+    def __init__(self, store: SiteStore, directory: str = STORE_DIR, fsync_interval: float = STORE_FSYNC_SECONDS,
+                 compact_after: int = STORE_COMPACT_AFTER):
+        self.store = store
+        self.directory = directory
+        self.fsync_interval = fsync_interval
+        self.compact_after = compact_after
+        self.snapshot_path = os.path.join(directory, "sites.snapshot")
+        self.log_path = os.path.join(directory, "sites.log")
+        self._pending = []
+        self._log_entries = 0
+        self._lock = asyncio.Lock()
+        self._task = None
+        self._closing = False
+
+    # ---------- Encoding ----------
+
+    @staticmethod
+    def _encode(record: SiteRecord) -> list:
+        return ["put", record.version, record.name, record.url, record.status, record.response_time,
+                record.status_code, record.last_checked, record.ssl_expiry_days]
+
+    def _apply(self, entry: list):
+        op, version = entry[0], entry[1]
+        if op == "put":
+            _, _, name, url, status, response_time, status_code, last_checked, ssl_days = entry
+            record = self.store.get(name)
+            if record is None or record.url != url:
+                self.store.remove(name)
+                record = self.store.add(name, url)
+            self.store.record_result(record, status, response_time, status_code, ssl_days, checked_at=last_checked)
+        elif op == "del":
+            self.store.remove(entry[2])
+        # "version" header lines only carry the store version
+        return version
+
+    # ---------- Recording changes ----------
+
+    def log_put(self, record: SiteRecord):
+        self._pending.append(self._encode(record))
+
+    def log_delete(self, name: str):
+        self._pending.append(["del", self.store.version, name])
+
+    # ---------- Startup ----------
+
+    def load(self) -> int:
+        """Rebuild the store from disk, returns the number of sites restored"""
+        os.makedirs(self.directory, exist_ok=True)
+        version = 0
+        for path in (self.snapshot_path, self.log_path):
+            if not os.path.exists(path):
+                continue
+            offset = good_end = 0
+            with open(path, "rb") as f:
+                for line in f:
+                    offset += len(line)
+                    try:
+                        # A line without its newline was cut off mid-write
+                        if not line.endswith(b"\n"):
+                            raise ValueError("unterminated line")
+                        entry = json.loads(line)
+                    except ValueError:
+                        print(f"Skipping torn entry in {path}")
+                        continue
+                    good_end = offset
+                    version = max(version, self._apply(entry))
+                    if path == self.log_path:
+                        self._log_entries += 1
+            if path == self.log_path and good_end < offset:
+                # Cut the torn tail off, or the next append would be glued onto it
+                with open(path, "r+b") as f:
+                    f.truncate(good_end)
+                    os.fsync(f.fileno())
+        # Continue the version sequence so clients' ETags and ?since= stay meaningful
+        self.store.restore_version(version)
+        return len(self.store)
+
+    # ---------- Writing ----------
+
+    def _append(self, lines: list):
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.write("".join(lines))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _write_snapshot(self, lines: list):
+        temp_path = self.snapshot_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write("".join(lines))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.snapshot_path)
+        # Everything in the log is now covered by the snapshot
+        with open(self.log_path, "w", encoding="utf-8") as f:
+            os.fsync(f.fileno())
+
+    async def flush(self):
+        """Write queued changes to the log, compacting into a snapshot when the log is long"""
+        async with self._lock:
+            batch, self._pending = self._pending, []
+            if batch:
+                await asyncio.to_thread(self._append, [json.dumps(entry) + "\n" for entry in batch])
+                self._log_entries += len(batch)
+            if self._log_entries >= self.compact_after:
+                await self.compact()
+
+    async def compact(self):
+        """Write a full snapshot and truncate the log"""
+        # Encoded in one go on the event loop, so the snapshot is a consistent point in time
+        lines = [json.dumps(["version", self.store.version]) + "\n"]
+        lines.extend(json.dumps(self._encode(record)) + "\n" for record in self.store.records.values())
+        await asyncio.to_thread(self._write_snapshot, lines)
+        self._log_entries = 0
+
+    async def _run(self):
+        while not self._closing:
+            await asyncio.sleep(self.fsync_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Error writing store journal: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Stop the background writer and flush what is left"""
+        self._closing = True
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        self._closing = False
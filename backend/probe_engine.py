@@ -0,0 +1,211 @@
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+import aiohttp
+
+# Probe engine configuration
+PROBE_CONCURRENCY = int(os.getenv("PROBE_CONCURRENCY", "200"))
+PROBE_PER_HOST_LIMIT = int(os.getenv("PROBE_PER_HOST_LIMIT", "4"))
+PROBE_TIMEOUT_SECONDS = float(os.getenv("PROBE_TIMEOUT_SECONDS", "10"))
+PROBE_MEASURE_COLD = os.getenv("PROBE_MEASURE_COLD", "false").lower() == "true"
+
+CERT_CACHE_SIZE = int(os.getenv("CERT_CACHE_SIZE", "10000"))
+
+USER_AGENT = 'Mozilla/5.0 (Website Monitor Bot)'
+
+# Certificate expiry dates keyed by (hostname, sha256 fingerprint)
+_cert_expiry_cache = OrderedDict()
+
+def get_cert_expiry(hostname: str, ssl_object):
+    """Expiry date of the peer certificate on an open TLS session
+
+    The certificate is only parsed the first time a (hostname, fingerprint)
+    pair is seen; renewed certificates get a new fingerprint and a new entry.
+    """
+    der = ssl_object.getpeercert(binary_form=True)
+    if not der:
+        return None
+    key = (hostname, hashlib.sha256(der).hexdigest())
+    expiry = _cert_expiry_cache.get(key)
+    if expiry is not None:
+        _cert_expiry_cache.move_to_end(key)
+        return expiry
+
+    cert = ssl_object.getpeercert()
+    if not cert or "notAfter" not in cert:
+        return None
+    expiry = datetime.strptime(cert["notAfter"], "%b %d %H:%M:%S %Y %Z")
+    _cert_expiry_cache[key] = expiry
+    if len(_cert_expiry_cache) > CERT_CACHE_SIZE:
+        _cert_expiry_cache.popitem(last=False)
+    return expiry
+
+class CertTrackingConnector(aiohttp.TCPConnector):
+    """TCPConnector that notes the certificate expiry of every TLS connection it opens
+
+    The certificate is read while the new connection is still in hand, so it is
+    known no matter when the server closes the connection afterwards.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cert_expiry = OrderedDict()  # (host, port) -> expiry of the newest connection's certificate
+
+    async def _create_connection(self, req, traces, timeout):
+        protocol = await super()._create_connection(req, traces, timeout)
+        transport = protocol.transport
+        ssl_object = transport.get_extra_info("ssl_object") if transport is not None else None
+        if ssl_object is not None:
+            key = (req.url.host, req.url.port)
+            self._cert_expiry[key] = get_cert_expiry(req.url.host, ssl_object)
+            self._cert_expiry.move_to_end(key)
+            if len(self._cert_expiry) > CERT_CACHE_SIZE:
+                self._cert_expiry.popitem(last=False)
+        return protocol
+
+    def ssl_expiry_days(self, url):
+        """Days until the certificate served for url's host expires (None for plain HTTP)"""
+        if url.scheme != "https":
+            return None
+        expiry = self._cert_expiry.get((url.host, url.port))
+        return (expiry - datetime.utcnow()).days if expiry else None
+
+class ProbeEngine:
+    """Non-blocking HTTP probe engine with global and per-host concurrency limits"""
+
+    def __init__(self, concurrency: int = PROBE_CONCURRENCY, per_host_limit: int = PROBE_PER_HOST_LIMIT,
+                 timeout: float = PROBE_TIMEOUT_SECONDS, measure_cold: bool = PROBE_MEASURE_COLD):
+        self.concurrency = concurrency
+        self.per_host_limit = per_host_limit
+        self.timeout = timeout
+        self.measure_cold = measure_cold
+        self._session = None
+        self._semaphore = None
+        self._timings = {"cold_probes": 0, "warm_probes": 0, "failed_probes": 0, "cold_time": 0.0, "warm_time": 0.0,
+                         "connect_time": 0.0}
+
+    def _trace_configs(self) -> list:
+        """Trace hooks that record connect time and whether a pooled connection was reused"""
+        if not self.measure_cold:
+            return []
+
+        async def on_create_start(session, ctx, params):
+            ctx.trace_request_ctx["connect_started"] = time.time()
+
+        async def on_create_end(session, ctx, params):
+            timing = ctx.trace_request_ctx
+            timing["connect_time"] += time.time() - timing.pop("connect_started", time.time())
+            timing["cold"] = True
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_start.append(on_create_start)
+        trace_config.on_connection_create_end.append(on_create_end)
+        return [trace_config]
+
+    async def start(self):
+        """Create the underlying HTTP session (safe to call more than once)"""
+        if self._session is not None and not self._session.closed:
+            return
+        connector = CertTrackingConnector(
+            limit=self.concurrency,
+            limit_per_host=self.per_host_limit,
+            ttl_dns_cache=300
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers={'User-Agent': USER_AGENT},
+            trace_configs=self._trace_configs()
+        )
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+
+    async def close(self):
+        """Close the HTTP session and release all pooled connections"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def probe(self, url: str) -> tuple:
+        """Probe a URL and return (status, response_time, status_code)
+
+        Same contract as status_checker.get_website_status_with_metrics:
+        2xx/3xx is 'UP', anything else is 'Down', and status_code is None on errors.
+        """
+        result = await self.probe_detailed(url)
+        return result["status"], result["response_time"], result["status_code"]
+
+    async def probe_detailed(self, url: str) -> dict:
+        """Probe a URL and return the result together with its connection timings
+
+        For HTTPS, ssl_expiry_days comes from the certificate the connector saw
+        when it opened the connection, so no second handshake is needed.
+        With measure_cold enabled, connect_time is the time spent opening new
+        connections and cold tells whether the probe paid for one, so warm
+        (pooled) requests can be reported apart from cold ones.
+        """
+        await self.start()
+        timing = {"connect_time": 0.0, "cold": False}
+        ssl_days = None
+        async with self._semaphore:
+            start_time = time.time()
+            try:
+                async with self._session.get(url, allow_redirects=True, trace_request_ctx=timing) as response:
+                    # Read the body so the connection can go back to the pool
+                    await response.read()
+                    ssl_days = self._session.connector.ssl_expiry_days(response.url)
+                    response_time = time.time() - start_time
+                    status = 'UP' if 200 <= response.status < 400 else 'Down'
+                    status_code = response.status
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                response_time = time.time() - start_time
+                print(f"Error checking {url}: {e!r}")
+                status, status_code = 'Down', None
+
+        result = {"status": status, "response_time": response_time, "status_code": status_code,
+                  "ssl_expiry_days": ssl_days}
+        if self.measure_cold:
+            self._record_timing(timing, response_time, failed=status_code is None)
+            result["connect_time"] = timing["connect_time"]
+            result["cold"] = timing["cold"]
+        return result
+
+    def _record_timing(self, timing: dict, response_time: float, failed: bool = False):
+        if failed:
+            # No response: a failed connect never reports itself as cold, and a timeout only
+            # measures the timeout - neither belongs in the warm or cold averages
+            self._timings["failed_probes"] += 1
+            return
+        kind = "cold" if timing["cold"] else "warm"
+        self._timings[f"{kind}_probes"] += 1
+        self._timings[f"{kind}_time"] += response_time
+        self._timings["connect_time"] += timing["connect_time"]
+
+    def timing_stats(self) -> dict:
+        """Average response times of cold (new connection) and warm (reused) probes
+
+        Probes that got no response are only counted, under failed_probes.
+        """
+        t = self._timings
+        return {
+            "measure_cold": self.measure_cold,
+            "cold_probes": t["cold_probes"],
+            "warm_probes": t["warm_probes"],
+            "failed_probes": t["failed_probes"],
+            "avg_cold_response_time": round(t["cold_time"] / t["cold_probes"], 3) if t["cold_probes"] else 0,
+            "avg_warm_response_time": round(t["warm_time"] / t["warm_probes"], 3) if t["warm_probes"] else 0,
+            "avg_connect_time": round(t["connect_time"] / t["cold_probes"], 3) if t["cold_probes"] else 0
+        }
+
+    async def probe_many(self, urls: list) -> list:
+        """Probe many URLs concurrently, results are returned in input order"""
+        return await asyncio.gather(*(self.probe(url) for url in urls))
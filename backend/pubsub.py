@@ -0,0 +1,68 @@
+import asyncio
+import os
+
+# Per-client send queue size, and how many events a client may miss before it is dropped
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "100"))
+STREAM_MAX_DROPPED = int(os.getenv("STREAM_MAX_DROPPED", "1000"))
+
+class Subscriber:
+    """One connected client with its own bounded send queue"""
+
+    def __init__(self, maxsize: int):
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+        self.closed = False
+
+    def offer(self, event: dict):
+        """Queue an event without ever blocking the publisher
+
+        When the queue is full the oldest event is dropped, so a slow client
+        skips stale updates instead of stalling the broadcast.
+        """
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def next_event(self, timeout: float):
+        """Next queued event, or None after timeout seconds without one"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+class Broadcaster:
+    """In-process pub/sub that fans events out to every subscriber"""
+
+    def __init__(self, queue_size: int = STREAM_QUEUE_SIZE, max_dropped: int = STREAM_MAX_DROPPED):
+        self.queue_size = queue_size
+        self.max_dropped = max_dropped
+        self._subscribers = set()
+
+    @property
+    def has_subscribers(self) -> bool:
+        return bool(self._subscribers)
+
+    def subscribe(self) -> Subscriber:
+        subscriber = Subscriber(self.queue_size)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        subscriber.closed = True
+        self._subscribers.discard(subscriber)
+
+    def publish(self, event: dict):
+        for subscriber in list(self._subscribers):
+            subscriber.offer(event)
+            if subscriber.dropped > self.max_dropped:
+                # Hopelessly behind - cut it loose, the client reconnects and resyncs
+                print(f"Dropping stream subscriber after {subscriber.dropped} missed events")
+                self.unsubscribe(subscriber)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self._subscribers),
+            "queued": sum(s.queue.qsize() for s in self._subscribers),
+            "dropped": sum(s.dropped for s in self._subscribers)
+        }
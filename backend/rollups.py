@@ -0,0 +1,154 @@
+import math
+import os
+from datetime import datetime, timedelta
+from pymongo import UpdateOne
+
+# Rollup retention - minute buckets are only kept long enough to cover window edges
+ROLLUP_RETENTION = {
+    "minute": timedelta(days=int(os.getenv("ROLLUP_MINUTE_RETENTION_DAYS", "2"))),
+    "hour": timedelta(days=int(os.getenv("ROLLUP_HOUR_RETENTION_DAYS", "35"))),
+    "day": timedelta(days=int(os.getenv("ROLLUP_DAY_RETENTION_DAYS", "400")))
+}
+
+# Latency histogram: log-spaced buckets in milliseconds, each HISTOGRAM_GAMMA times wider than the last
+HISTOGRAM_GAMMA = 1.1
+_LOG_GAMMA = math.log(HISTOGRAM_GAMMA)
+
+def bucket_start(ts: datetime, granularity: str) -> datetime:
+    """Start of the minute/hour/day bucket that contains ts"""
+    if granularity == "minute":
+        return ts.replace(second=0, microsecond=0)
+    if granularity == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def _next_boundary(ts: datetime, granularity: str) -> datetime:
+    """First bucket boundary of the given granularity at or after ts"""
+    start = bucket_start(ts, granularity)
+    if start == ts:
+        return ts
+    return start + (timedelta(hours=1) if granularity == "hour" else timedelta(days=1))
+
+def histogram_index(response_time: float) -> int:
+    """Histogram bucket for a response time in seconds"""
+    ms = max(response_time * 1000, 1.0)
+    return int(math.ceil(math.log(ms) / _LOG_GAMMA))
+
+def histogram_value(index: int) -> float:
+    """Representative response time (seconds) of a histogram bucket"""
+    # Midpoint of the bucket's bounds - within (HISTOGRAM_GAMMA - 1) / 2 relative error
+    upper = HISTOGRAM_GAMMA ** index
+    return (upper + upper / HISTOGRAM_GAMMA) / 2 / 1000
+
+def histogram_quantiles(hist: dict, quantiles: tuple, lower: float = None, upper: float = None) -> list:
+    """Approximate quantiles from a (merged) latency histogram
+
+    Histograms merge by adding counts, so any time range can be answered from
+    its rollups without touching raw samples. lower/upper (the exact min and
+    max) clamp the estimates at the extremes.
+    """
+    total = sum(hist.values())
+    if total == 0:
+        return [0 for _ in quantiles]
+
+    results = []
+    ordered = sorted(hist.items())
+    for q in quantiles:
+        rank = q * (total - 1)
+        seen = 0
+        for index, count in ordered:
+            seen += count
+            if seen > rank:
+                value = histogram_value(index)
+                break
+        if lower is not None:
+            value = max(value, lower)
+        if upper is not None:
+            value = min(value, upper)
+        results.append(value)
+    return results
+
+def rollup_updates(history: list) -> list:
+    """Upserts that add a batch of status_history rows to the minute, hour and day rollups
+
+    Rows of the same site and bucket are combined first, so a batch costs one
+    write per (site, granularity, bucket) rather than one per row.
+    """
+    buckets = {}
+    for row in history:
+        if "status" not in row or "checked_at" not in row:
+            continue  # status_change events are not checks
+        for granularity in ROLLUP_RETENTION:
+            key = (row["name"], granularity, bucket_start(row["checked_at"], granularity))
+            acc = buckets.get(key)
+            if acc is None:
+                acc = buckets[key] = {"count": 0, "up": 0, "down": 0, "rt_count": 0, "rt_sum": 0.0,
+                                      "rt_min": None, "rt_max": None, "hist": {}}
+            acc["count"] += 1
+            if row["status"] == "UP":
+                acc["up"] += 1
+            elif row["status"] == "Down":
+                acc["down"] += 1
+            response_time = row.get("response_time")
+            if response_time is not None:
+                acc["rt_count"] += 1
+                acc["rt_sum"] += response_time
+                acc["rt_min"] = response_time if acc["rt_min"] is None else min(acc["rt_min"], response_time)
+                acc["rt_max"] = response_time if acc["rt_max"] is None else max(acc["rt_max"], response_time)
+                index = histogram_index(response_time)
+                acc["hist"][index] = acc["hist"].get(index, 0) + 1
+
+    updates = []
+    for (name, granularity, bucket), acc in buckets.items():
+        inc = {"count": acc["count"], "up": acc["up"], "down": acc["down"],
+               "rt_count": acc["rt_count"], "rt_sum": acc["rt_sum"]}
+        for index, count in acc["hist"].items():
+            inc[f"hist.{index}"] = count
+        update = {
+            "$inc": inc,
+            "$setOnInsert": {"expire_at": bucket + ROLLUP_RETENTION[granularity]}
+        }
+        # Only touch min/max when there are samples - null sorts below numbers
+        if acc["rt_count"]:
+            update["$min"] = {"rt_min": acc["rt_min"]}
+            update["$max"] = {"rt_max": acc["rt_max"]}
+        updates.append(UpdateOne({"name": name, "granularity": granularity, "bucket": bucket}, update, upsert=True))
+    return updates
+
+def window_filter(name: str, since: datetime, until: datetime = None) -> dict:
+    """Rollup query covering [since, until) with as few, as coarse buckets as possible
+
+    Minute buckets fill the partial hour at the start of the window, hour
+    buckets the partial day, and whole days the rest. Buckets containing until
+    are included whole since nothing newer than now exists.
+    """
+    until = until or datetime.utcnow()
+    if since < until - ROLLUP_RETENTION["minute"]:
+        t = bucket_start(since, "hour")  # minute buckets this old have expired
+    else:
+        t = bucket_start(since, "minute")
+
+    ranges = []
+    for granularity, coarser in (("minute", "hour"), ("hour", "day")):
+        end = min(_next_boundary(t, coarser), until)
+        if t < end:
+            ranges.append({"granularity": granularity, "bucket": {"$gte": t, "$lt": end}})
+            t = end
+    if t < until:
+        ranges.append({"granularity": "day", "bucket": {"$gte": t, "$lt": until}})
+    return {"name": name, "$or": ranges}
+
+def merge_rollups(documents: list) -> dict:
+    """Combine rollup documents into one set of totals"""
+    merged = {"count": 0, "up": 0, "down": 0, "rt_count": 0, "rt_sum": 0.0,
+              "rt_min": None, "rt_max": None, "hist": {}}
+    for doc in documents:
+        for field in ("count", "up", "down", "rt_count", "rt_sum"):
+            merged[field] += doc.get(field, 0)
+        if doc.get("rt_min") is not None:
+            merged["rt_min"] = doc["rt_min"] if merged["rt_min"] is None else min(merged["rt_min"], doc["rt_min"])
+        if doc.get("rt_max") is not None:
+            merged["rt_max"] = doc["rt_max"] if merged["rt_max"] is None else max(merged["rt_max"], doc["rt_max"])
+        for index, count in doc.get("hist", {}).items():
+            merged["hist"][int(index)] = merged["hist"].get(int(index), 0) + count
+    return merged
@@ -35,8 +35,12 @@ def run_status_checker():
     except Exception as e:
         print(f"Error running status checker: {e}")
 
-def monitor_processes():
-    """Monitor and restart processes if they fail"""
+def monitor_processes(checker_mode: str = None):
+    """Monitor and restart processes if they fail
+
+    checker_mode sets RUN_MODE for the status checker, e.g. "multicore" to
+    spread its probes over one worker process per core.
+    """
     global shutdown_flag
     fastapi_process = None
     checker_process = None
@@ -57,9 +61,10 @@ def monitor_processes():
             if checker_process is None or checker_process.poll() is not None:
                 print("Starting status checker...")
                 time.sleep(5)  # Wait a bit for FastAPI
+                env = dict(os.environ, RUN_MODE=checker_mode) if checker_mode else None
                 checker_process = subprocess.Popen([
                     sys.executable, "status_checker.py"
-                ])
+                ], env=env)
             
             time.sleep(10)  # Check every 10 seconds
             
@@ -81,7 +86,7 @@ def monitor_processes():
 
 def main():
     """Main entry point with different startup modes"""
-    mode = os.getenv("STARTUP_MODE", "threading")  # Options: threading, monitoring, separate
+    mode = os.getenv("STARTUP_MODE", "threading")  # Options: threading, monitoring, multicore, embedded, separate
     
     # Set up signal handlers
     signal.signal(signal.SIGINT, signal_handler)
@@ -95,6 +100,16 @@ def main():
         # Process monitoring mode with auto-restart
         monitor_processes()
         
+    elif mode == "multicore":
+        # Monitoring mode with the checker probing from one process per core
+        monitor_processes(checker_mode="multicore")
+        
+    elif mode == "embedded":
+        # One process: the checker runs inside the FastAPI app, no startup wait
+        print("Running FastAPI with the embedded status checker.")
+        os.environ["EMBEDDED_CHECKER"] = "true"
+        run_fastapi()
+        
     elif mode == "separate":
         # Run only FastAPI (status checker should be run separately)
         print("Running FastAPI only. Start status_checker.py separately.")
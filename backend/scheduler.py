@@ -0,0 +1,209 @@
+import asyncio
+import heapq
+import os
+import random
+import time
+
+# Scheduler configuration
+SCHEDULER_JITTER = float(os.getenv("SCHEDULER_JITTER", "0.1"))  # +/- fraction of the interval
+SCHEDULER_MIN_INTERVAL_SECONDS = float(os.getenv("SCHEDULER_MIN_INTERVAL_SECONDS", "30"))
+SCHEDULER_STABLE_RUNS = int(os.getenv("SCHEDULER_STABLE_RUNS", "10"))
+SCHEDULER_STABLE_BACKOFF = float(os.getenv("SCHEDULER_STABLE_BACKOFF", "2.0"))
+SCHEDULER_MAX_IN_FLIGHT = int(os.getenv("SCHEDULER_MAX_IN_FLIGHT", "500"))
+SCHEDULER_CONFIRM_SECONDS = float(os.getenv("SCHEDULER_CONFIRM_SECONDS", "10"))
+
+class AdaptiveScheduler:
+    """Heap-based per-site probe scheduler
+
+    Every site has its own interval (the site's check_interval or the default).
+    Due times are jittered so probes spread evenly over the period instead of
+    firing in one burst. After a status change a site is probed at
+    SCHEDULER_MIN_INTERVAL_SECONDS, and the interval grows back on every stable
+    probe. Sites stable for SCHEDULER_STABLE_RUNS probes back off further to
+    SCHEDULER_STABLE_BACKOFF times their base interval.
+
+    probe is an async callable that takes a site dict and returns its status,
+    or None when it got no result (the site is then retried soon).
+    If confirm(name) is given and returns True after a probe, the site is
+    re-probed after SCHEDULER_CONFIRM_SECONDS to confirm a pending transition.
+    """
+
+    def __init__(self, probe, default_interval: float, jitter: float = SCHEDULER_JITTER,
+                 min_interval: float = SCHEDULER_MIN_INTERVAL_SECONDS, stable_runs: int = SCHEDULER_STABLE_RUNS,
+                 stable_backoff: float = SCHEDULER_STABLE_BACKOFF, max_in_flight: int = SCHEDULER_MAX_IN_FLIGHT,
+                 confirm=None, confirm_interval: float = SCHEDULER_CONFIRM_SECONDS):
+        self.probe = probe
+        self.default_interval = default_interval
+        self.jitter = jitter
+        self.min_interval = min_interval
+        self.stable_runs = stable_runs
+        self.stable_backoff = stable_backoff
+        self.confirm = confirm
+        self.confirm_interval = confirm_interval
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._heap = []  # (due, seq, name) - seq also marks the site's live entry
+        self._seq = 0
+        self._sites = {}  # name -> per-site state
+        self._tasks = set()
+        self._wakeup = asyncio.Event()
+        self._running = False
+        self._metrics = {"probes": 0, "confirmations": 0, "in_flight": 0, "last_lag": 0.0, "avg_lag": 0.0, "max_lag": 0.0}
+
+    # ---------- Site registry ----------
+
+    def sync_sites(self, sites: list):
+        """Add new sites, update changed URLs and drop sites that are gone"""
+        seen = set()
+        for site in sites:
+            name = site["name"]
+            seen.add(name)
+            state = self._sites.get(name)
+            if state is None:
+                self.add_site(site)
+            else:
+                state["site"] = site
+                state["base"] = float(site.get("check_interval") or self.default_interval)
+        for name in list(self._sites):
+            if name not in seen:
+                self.remove_site(name)
+
+    def add_site(self, site: dict):
+        base = float(site.get("check_interval") or self.default_interval)
+        self._sites[site["name"]] = {
+            "site": site,
+            "base": base,
+            "interval": base,
+            "last_status": None if site.get("current_status") == "Checking" else site.get("current_status"),
+            "stable_runs": 0,
+            "seq": 0
+        }
+        # Sites still 'Checking' go first, the rest are spread over one interval
+        delay = 0 if site.get("current_status", "Checking") == "Checking" else random.uniform(0, base)
+        self._push(site["name"], time.monotonic() + delay)
+
+    def remove_site(self, name: str):
+        # Heap entries of removed sites are skipped when they come due
+        self._sites.pop(name, None)
+
+    def _push(self, name: str, due: float):
+        self._seq += 1
+        self._sites[name]["seq"] = self._seq
+        heapq.heappush(self._heap, (due, self._seq, name))
+        self._wakeup.set()
+
+    # ---------- Adaptive intervals ----------
+
+    def _next_interval(self, state: dict, status) -> float:
+        base = state["base"]
+        if state["last_status"] is not None and status != state["last_status"]:
+            # Status changed - watch the site closely for a while
+            state["stable_runs"] = 0
+            return min(base, self.min_interval)
+
+        state["stable_runs"] += 1
+        ceiling = base * self.stable_backoff if state["stable_runs"] >= self.stable_runs else base
+        return min(ceiling, state["interval"] * 1.5)
+
+    def _jittered(self, interval: float) -> float:
+        return interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    # ---------- Run loop ----------
+
+    async def run(self):
+        """Dispatch probes as they come due until stop() is called"""
+        self._running = True
+        while self._running:
+            await self._slots.acquire()
+            entry = await self._next_due()
+            if entry is None:
+                self._slots.release()
+                continue
+
+            due, _, name = entry
+            lag = max(0.0, time.monotonic() - due)
+            m = self._metrics
+            m["last_lag"] = lag
+            m["avg_lag"] = lag if m["probes"] == 0 else 0.9 * m["avg_lag"] + 0.1 * lag
+            m["max_lag"] = max(m["max_lag"], lag)
+            m["probes"] += 1
+
+            task = asyncio.create_task(self._run_probe(name))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _next_due(self):
+        """Wait for the next live heap entry to come due, None if woken up early"""
+        while self._heap:
+            due, seq, name = self._heap[0]
+            state = self._sites.get(name)
+            if state is None or state["seq"] != seq:
+                heapq.heappop(self._heap)  # stale entry
+                continue
+            delay = due - time.monotonic()
+            if delay <= 0:
+                return heapq.heappop(self._heap)
+            break
+        else:
+            delay = None
+
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+        except asyncio.TimeoutError:
+            pass
+        return None
+
+    async def _run_probe(self, name: str):
+        state = self._sites.get(name)
+        self._metrics["in_flight"] += 1
+        status = None
+        try:
+            status = await self.probe(state["site"])
+        except Exception as e:
+            print(f"Scheduled probe of {name} failed: {e}")
+        finally:
+            self._metrics["in_flight"] -= 1
+            self._slots.release()
+
+        # The site may have been removed (or re-added) while the probe ran
+        if self._sites.get(name) is not state:
+            return
+        if status is None:
+            # No result - try again soon and leave the site's interval and status alone
+            self._push(name, time.monotonic() + self._jittered(min(state["interval"], self.min_interval)))
+            return
+        state["interval"] = self._next_interval(state, status)
+        state["last_status"] = status
+        if self.confirm is not None and self.confirm(name):
+            self._metrics["confirmations"] += 1
+            self._push(name, time.monotonic() + self._jittered(self.confirm_interval))
+        else:
+            self._push(name, time.monotonic() + self._jittered(state["interval"]))
+
+    async def stop(self):
+        """Stop dispatching and wait for in-flight probes to finish"""
+        self._running = False
+        self._wakeup.set()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    # ---------- Metrics ----------
+
+    def metrics(self) -> dict:
+        """Queue depth and dispatch lag (seconds between due time and actual start)"""
+        now = time.monotonic()
+        overdue = sum(
+            1 for due, seq, name in self._heap
+            if due <= now and name in self._sites and self._sites[name]["seq"] == seq
+        )
+        return {
+            "sites": len(self._sites),
+            "queue_depth": len(self._sites) - self._metrics["in_flight"],
+            "overdue": overdue,
+            "in_flight": self._metrics["in_flight"],
+            "probes": self._metrics["probes"],
+            "confirmations": self._metrics["confirmations"],
+            "last_lag": round(self._metrics["last_lag"], 3),
+            "avg_lag": round(self._metrics["avg_lag"], 3),
+            "max_lag": round(self._metrics["max_lag"], 3)
+        }
@@ -1,70 +1,87 @@
 import asyncio
 import schedule
-import time
-import requests
 from http import HTTPStatus
-import motor.motor_asyncio
 import os
+import signal
 from dotenv import load_dotenv
 from datetime import datetime
-import smtplib
-from email.message import EmailMessage
+import http_client
+from scheduler import AdaptiveScheduler
+from write_buffer import WriteBuffer
+from partitions import HistoryPartitions, HISTORY_RETENTION_DAYS
+from alerts import AlertDispatcher
+from flapping import FlapDetector
+from leases import LeaseManager, CHECKER_SHARDS, shard_for
+from multicore import ProbePoolError
+import mongo
 
 load_dotenv()
 
-# Database setup
-DB_URL = os.getenv("DB_URL", "mongodb://localhost:27017")
-client = motor.motor_asyncio.AsyncIOMotorClient(DB_URL)
-database = client.StatusList
-collection = database.status
-history_collection = database.status_history
+# Database setup - shared lazily-connected client, see mongo.py
+database = mongo.database
+collection = mongo.collection("status")
+history_collection = mongo.collection("status_history")
+analytics_collection = mongo.collection("analytics")
+# status_history, or its day/week partitions (see partitions.py)
+history = HistoryPartitions(database)
 
-# Email configuration (optional)
-EMAIL_ADDRESS = os.getenv("EMAIL_ADDRESS")
-EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")
-ALERT_EMAIL = os.getenv("ALERT_EMAIL")
+HISTORY_BACKEND = os.getenv("HISTORY_BACKEND", "mongo")  # mongo or columnar (tsstore.py)
 
-def get_website_status_with_metrics(url: str) -> tuple:
-    """Get website status with response time and status code - with proper error handling"""
-    start_time = time.time()
-    try:
-        # Add timeout and proper headers
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Website Monitor Bot)'
-        }
-        response = requests.get(url, timeout=10, allow_redirects=True, headers=headers)
-        response_time = time.time() - start_time
-        
-        # Consider 2xx and 3xx as UP, everything else as Down
-        status = 'UP' if 200 <= response.status_code < 400 else 'Down'
-        return status, response_time, response.status_code
-        
-    except requests.exceptions.RequestException as e:
-        response_time = time.time() - start_time
-        print(f"Error checking {url}: {e}")
-        return 'Down', response_time, None
+# Status and history writes are batched, see write_buffer.py
+if HISTORY_BACKEND == "columnar":
+    import tsstore
+    # History rows go to the chunk files, analytics are computed from them so no rollups
+    write_buffer = WriteBuffer(collection, tsstore.history_store)
+else:
+    write_buffer = WriteBuffer(collection, history, analytics_collection)
+
+# Last confirmed status per site, so transitions are detected without reading the status doc back
+last_status = {}
+
+# Debounces raw probe results into confirmed transitions, see flapping.py
+flaps = FlapDetector()
+
+# Shard leases when several checkers share the fleet (CHECKER_SHARDS > 0), see leases.py
+leases = None
+
+# Email alerts are queued and sent off the probe path, see alerts.py
+alerts = AlertDispatcher()
+
+# Probe worker processes in RUN_MODE=multicore, see multicore.py
+probe_pool = None
+
+async def get_website_status_with_metrics(url: str) -> tuple:
+    """Get website status with response time and status code without blocking the event loop"""
+    if probe_pool is not None:
+        return await probe_pool.probe(url)
+    return await http_client.get_engine().probe(url)
 
 async def get_websites_from_db():
-    """Get ALL websites from database - including ones with 'Checking' status"""
+    """Get ALL websites from database - including ones with 'Checking' status, None if the read failed"""
     try:
         websites = []
         # ✅ FIXED: Don't filter out any status - get ALL websites
         cursor = collection.find({})  # No filter to exclude "Checking"
         async for doc in cursor:
+            if leases is not None and not leases.owns(doc['name']):
+                continue  # another worker's shard
+            # Seed the status cache - entries we already have are newer than the (buffered) DB copy
+            last_status.setdefault(doc['name'], doc.get('status', 'Checking'))
             websites.append({
                 'name': doc['name'], 
                 'url': doc['url'],
-                'current_status': doc.get('status', 'Checking')
+                'current_status': doc.get('status', 'Checking'),
+                'check_interval': doc.get('check_interval')  # optional per-site interval in seconds
             })
         return websites
     except Exception as e:
         print(f"Error fetching websites from database: {e}")
-        return []
+        return None
 
 async def log_status_history(name: str, url: str, status: str, response_time: float = None, status_code: int = None):
-    """Log each status check with detailed information"""
+    """Log each status check with detailed information (buffered)"""
     try:
-        await history_collection.insert_one({
+        write_buffer.add_history({
             "name": name,
             "url": url,
             "status": status,
@@ -76,9 +93,9 @@ async def log_status_history(name: str, url: str, status: str, response_time: fl
         print(f"Error logging status history: {e}")
 
 async def log_status_change(name: str, old_status: str, new_status: str):
-    """Log when a website status changes"""
+    """Log when a website status changes (buffered)"""
     try:
-        await history_collection.insert_one({
+        write_buffer.add_history({
             "name": name,
             "event_type": "status_change",
             "old_status": old_status,
@@ -89,71 +106,61 @@ async def log_status_change(name: str, old_status: str, new_status: str):
         print(f"Error logging status change: {e}")
 
 async def send_email_alert(name: str, url: str, old_status: str, new_status: str):
-    """Send email alert when status changes"""
-    if not all([EMAIL_ADDRESS, EMAIL_PASSWORD, ALERT_EMAIL]):
-        print("Email configuration not complete, skipping email alert")
-        return
-    
-    try:
-        subject = f"🚨 Status Alert: {name} is {new_status}"
-        body = f"""
-Website Status Change Alert
-
-Website: {name}
-URL: {url}
-Status Changed: {old_status} → {new_status}
-Time: {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')} UTC
-
-This is an automated alert from your website monitoring system.
-        """
-        
-        msg = EmailMessage()
-        msg.set_content(body)
-        msg["Subject"] = subject
-        msg["From"] = EMAIL_ADDRESS
-        msg["To"] = ALERT_EMAIL
-
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465) as smtp:
-            smtp.login(EMAIL_ADDRESS, EMAIL_PASSWORD)
-            smtp.send_message(msg)
-            
-        print(f"Email alert sent for {name}: {old_status} → {new_status}")
-    except Exception as e:
-        print(f"Error sending email alert: {e}")
+    """Queue an email alert for a status change - sent (and batched) by the alert dispatcher"""
+    alerts.enqueue(name, url, old_status, new_status)
 
 async def update_website_status_with_alerts(name: str, url: str, status: str, response_time: float, status_code: int):
-    """✅ FIXED: Always update website status, even from 'Checking' state"""
+    """Record a probe result, returns the confirmed status
+
+    Every probe goes to history, but the site's status only changes (and a
+    status_change row + alert are only produced) once the flap detector has
+    confirmed the transition. Alerts are held back while a site is flapping.
+    """
     try:
-        # Get current status before updating
-        old_doc = await collection.find_one({"name": name})
-        old_status = old_doc["status"] if old_doc else "Unknown"
+        if name not in last_status:
+            # First result since the site was (re)acquired - start from the stored status
+            document = await collection.find_one({"name": name}, {"status": 1})
+            last_status[name] = document.get("status", "Checking") if document else "Checking"
+        # Previous status comes from the in-process cache, not a find_one per probe
+        old_status, confirmed, flap_event = flaps.observe(name, status, last_status.get(name))
+        last_status[name] = confirmed
         
-        # ✅ FIXED: Always update the status with proper timestamp
-        result = await collection.update_one(
-            {"name": name}, 
-            {"$set": {
-                "status": status,
-                "last_updated": datetime.utcnow(),
-                "last_response_time": response_time,
-                "last_status_code": status_code
-            }}
-        )
+        # ✅ FIXED: Always update the status with proper timestamp (buffered)
+        write_buffer.update_status(name, {
+            "status": confirmed,
+            "last_updated": datetime.utcnow(),
+            "last_response_time": response_time,
+            "last_status_code": status_code,
+            "last_probe_status": status,
+            "flapping": flaps.is_flapping(name)
+        })
         
         # Log the status check
         await log_status_history(name, url, status, response_time, status_code)
         
-        # Send email alert if status changed AND it's not the first check
-        if old_status and old_status != "Checking" and old_status != status:
-            print(f"Status change detected for {name}: {old_status} → {status}")
-            await send_email_alert(name, url, old_status, status)
-            await log_status_change(name, old_status, status)
-        elif old_status == "Checking":
-            print(f"Initial check complete for {name}: {status} (Response: {response_time:.3f}s)")
+        if old_status is not None and old_status != confirmed:
+            print(f"Status change detected for {name}: {old_status} → {confirmed}")
+            await log_status_change(name, old_status, confirmed)
+            if not flaps.is_flapping(name):
+                await send_email_alert(name, url, old_status, confirmed)
+        elif old_status is None:
+            print(f"Initial check complete for {name}: {status} (Response: {response_time or 0:.3f}s)")
+        elif status != confirmed:
+            print(f"Unconfirmed {status} for {name}, still {confirmed}")
         else:
-            print(f"Updated {name}: {status} (Response: {response_time:.3f}s)")
+            print(f"Updated {name}: {status} (Response: {response_time or 0:.3f}s)")
+        
+        if flap_event == "flapping":
+            print(f"{name} is flapping - holding back alerts")
+            await send_email_alert(name, url, confirmed, "Flapping")
+        elif flap_event == "stable":
+            print(f"{name} stopped flapping, now {confirmed}")
+            await send_email_alert(name, url, "Flapping", confirmed)
+        return confirmed
         
     except Exception as e:
         print(f"Error updating {name}: {e}")
+        return status
 
 async def check_all_websites():
     """✅ FIXED: Check ALL websites including those with 'Checking' status"""
@@ -164,7 +171,7 @@ async def check_all_websites():
 
     print(f"Checking {len(websites)} websites...")
     
-    # Check all websites concurrently for better performance
+    # Check all websites concurrently - the probe engine bounds how many run at once
     tasks = []
     for site in websites:
         task = check_single_website(site)
@@ -174,22 +181,33 @@ async def check_all_websites():
     print("Finished checking all websites")
 
 async def check_single_website(site):
-    """Check a single website with proper error handling"""
+    """Check a single website with proper error handling, returns the status it recorded"""
+    if leases is not None and not leases.owns(site['name']):
+        # Shard handed over since the last refresh - its new owner probes it
+        return last_status.get(site['name'])
     try:
         print(f"Checking {site['name']} ({site['url']})...")
-        status, response_time, status_code = get_website_status_with_metrics(site['url'])
-        await update_website_status_with_alerts(
+        status, response_time, status_code = await get_website_status_with_metrics(site['url'])
+        if leases is not None and not leases.owns(site['name']):
+            return None  # shard lost while probing - the result is no longer ours to record
+        return await update_website_status_with_alerts(
             site['name'], 
             site['url'], 
             status, 
             response_time, 
             status_code
         )
+    except ProbePoolError as e:
+        # The pool lost the probe - no result, not an outage; the scheduler tries again soon
+        print(f"No result for {site['name']}: {e}")
+        return None
     except Exception as e:
         print(f"Error checking {site['name']}: {e}")
+        if leases is not None and not leases.owns(site['name']):
+            return None
         # ✅ FIXED: Even on error, update status to Down
         try:
-            await update_website_status_with_alerts(
+            return await update_website_status_with_alerts(
                 site['name'], 
                 site['url'], 
                 'Down', 
@@ -198,61 +216,145 @@ async def check_single_website(site):
             )
         except Exception as inner_e:
             print(f"Error updating failed check for {site['name']}: {inner_e}")
+        return 'Down'
+
+async def cleanup_old_history(days_to_keep: int = HISTORY_RETENTION_DAYS):
+    """Clean up old history data to prevent database bloat
 
-async def cleanup_old_history(days_to_keep: int = 30):
-    """Clean up old history data to prevent database bloat"""
+    Never deletes row by row: the columnar store drops whole day files,
+    partitioned history drops whole collections and unpartitioned history is
+    expired by its TTL index (which this makes sure exists).
+    """
     try:
-        from datetime import timedelta
-        cutoff_date = datetime.utcnow() - timedelta(days=days_to_keep)
+        if HISTORY_BACKEND == "columnar":
+            removed = await tsstore.cleanup_old_history(days_to_keep)
+            print(f"Cleaned up {removed} old history chunk files")
+            return
         
-        result = await history_collection.delete_many({
-            "checked_at": {"$lt": cutoff_date}
-        })
-        
-        print(f"Cleaned up {result.deleted_count} old history records")
+        history.retention_days = days_to_keep
+        dropped = await history.apply_retention()
+        if history.partitioned:
+            print(f"Dropped {len(dropped)} expired history partitions")
+        else:
+            print(f"History expires after {days_to_keep} days (TTL index)")
     except Exception as e:
         print(f"Error cleaning up old history: {e}")
 
-# ✅ FIXED: Simple continuous monitoring without schedule library issues
+def forget_shards(shards: set):
+    """Drop cached status and flap state of sites in shards we stopped owning"""
+    for name in [name for name in last_status if shard_for(name, CHECKER_SHARDS) in shards]:
+        del last_status[name]
+    flaps.retain(last_status)
+
+async def refresh_sites(scheduler: AdaptiveScheduler, refresh_interval: int):
+    """Keep the scheduler's site list in sync with the database (and with our shards)"""
+    while True:
+        if leases is None:
+            await asyncio.sleep(refresh_interval)
+        else:
+            try:
+                await asyncio.wait_for(leases.changed.wait(), timeout=refresh_interval)
+            except asyncio.TimeoutError:
+                pass
+            leases.changed.clear()
+        try:
+            websites = await get_websites_from_db()
+            if websites is None:
+                continue  # keep the current schedule until the database answers again
+            scheduler.sync_sites(websites)
+            # Forget sites that were deleted or moved to another worker
+            names = {site['name'] for site in websites}
+            for name in [name for name in last_status if name not in names]:
+                del last_status[name]
+            flaps.retain(names)
+            print(f"Scheduler: {scheduler.metrics()}")
+            print(f"Flap detector: {flaps.stats()}")
+            if leases is not None:
+                print(f"Leases: {leases.stats()}")
+        except Exception as e:
+            print(f"Error refreshing sites: {e}")
+
+async def cleanup_periodically(cleanup_interval: int):
+    """Run history cleanup now and then once per cleanup interval"""
+    while True:
+        # With shards, only the owner of shard 0 runs it
+        if leases is None or 0 in leases.owned:
+            await cleanup_old_history()
+        await asyncio.sleep(cleanup_interval)
+
 async def continuous_monitoring():
-    """Continuous monitoring approach with configurable intervals"""
+    """Continuous monitoring - every site is probed on its own jittered, adaptive schedule"""
     CHECK_INTERVAL = int(os.getenv("CHECK_INTERVAL_MINUTES", "2")) * 60  # Convert to seconds
+    SITE_REFRESH_INTERVAL = int(os.getenv("SITE_REFRESH_SECONDS", "60"))
     CLEANUP_INTERVAL = 24 * 3600  # 24 hours in seconds
     
-    last_cleanup = time.time()
+    global leases
     
-    print(f"Starting continuous monitoring (check every {CHECK_INTERVAL//60} minutes)")
+    print(f"Starting continuous monitoring (default interval {CHECK_INTERVAL//60} minutes)")
+    await mongo.bootstrap()
+    alerts.start()
+    if CHECKER_SHARDS > 0:
+        leases = LeaseManager(database, on_lost=forget_shards)
+        await leases.start()
     
-    # Run initial check immediately
-    print("Running initial check...")
-    await check_all_websites()
+    # Unconfirmed transitions get a quick re-probe instead of waiting a full interval
+    scheduler = AdaptiveScheduler(check_single_website, default_interval=CHECK_INTERVAL, confirm=flaps.pending)
+    scheduler.sync_sites(await get_websites_from_db() or [])
+    write_buffer.start()
+    background = [
+        asyncio.create_task(refresh_sites(scheduler, SITE_REFRESH_INTERVAL)),
+        asyncio.create_task(cleanup_periodically(CLEANUP_INTERVAL))
+    ]
     
-    while True:
-        try:
-            # Wait for next check
-            await asyncio.sleep(CHECK_INTERVAL)
-            
-            # Run website checks
-            await check_all_websites()
-            
-            # Run cleanup if needed (once per day)
-            current_time = time.time()
-            if current_time - last_cleanup >= CLEANUP_INTERVAL:
-                await cleanup_old_history()
-                last_cleanup = current_time
-            
-        except KeyboardInterrupt:
-            print("\nShutting down gracefully...")
-            break
-        except Exception as e:
-            print(f"Error in monitoring loop: {e}")
-            await asyncio.sleep(60)  # Wait 1 minute before retrying
+    try:
+        await scheduler.run()
+    finally:
+        print("\nShutting down gracefully...")
+        for task in background:
+            task.cancel()
+        await scheduler.stop()
+        if leases is not None:
+            await leases.close()
+        await alerts.close()
+        await write_buffer.close()
+        await http_client.shutdown()
+        mongo.close()
+
+async def multicore_monitoring():
+    """Continuous monitoring with the probes spread over one event loop per core
+
+    Scheduling, flap detection and every database write stay in this process.
+    """
+    from multicore import ProbePool
+
+    global probe_pool
+
+    # run.py stops the checker with SIGTERM - shut the workers down cleanly
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    probe_pool = ProbePool()
+    await probe_pool.start()
+    try:
+        await continuous_monitoring()
+    except asyncio.CancelledError:
+        pass
+    finally:
+        print(f"Probe pool: {probe_pool.stats()}")
+        await probe_pool.close()
+        probe_pool = None
 
 # ✅ FIXED: One-time check function for testing
 async def run_single_check():
     """Run a single check of all websites (useful for testing)"""
     print("Running single check of all websites...")
-    await check_all_websites()
+    try:
+        await mongo.bootstrap()
+        alerts.start()
+        await check_all_websites()
+    finally:
+        await alerts.close()
+        await write_buffer.close()
+        await http_client.shutdown()
+        mongo.close()
     print("Single check complete!")
 
 if __name__ == "__main__":
@@ -260,12 +362,14 @@ if __name__ == "__main__":
     print("=====================================")
     
     # Choose what to run
-    run_mode = os.getenv("RUN_MODE", "continuous")  # Options: continuous, single
+    run_mode = os.getenv("RUN_MODE", "continuous")  # Options: continuous, single, multicore
     
     try:
         if run_mode == "single":
             # For testing - just run once and exit
             asyncio.run(run_single_check())
+        elif run_mode == "multicore":
+            asyncio.run(multicore_monitoring())
         else:
             # Default - continuous monitoring
             asyncio.run(continuous_monitoring())
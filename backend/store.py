@@ -0,0 +1,196 @@
+import os
+import sys
+import time
+from typing import Dict, List, Optional
+
+# Interned enum codes - records store the index, labels only appear at the API boundary
+STATUSES = ("UP", "DOWN")
+STATUS_UP, STATUS_DOWN = 0, 1
+
+TRAFFIC_LABELS = (
+    "Server Down or Unreachable",
+    "Fast Response (Low Traffic)",
+    "Good Response (Normal Traffic)",
+    "Slow Response (High Traffic)",
+    "Very Slow (Heavy Traffic or Server Issues)"
+)
+
+MAX_TOMBSTONES = int(os.getenv("MAX_TOMBSTONES", "10000"))
+
+def traffic_code(response_time: float, status: int) -> int:
+    """Index into TRAFFIC_LABELS for a probe result"""
+    if status == STATUS_DOWN:
+        return 0
+    if response_time < 0.5:
+        return 1
+    if response_time < 1.5:
+        return 2
+    if response_time < 3.0:
+        return 3
+    return 4
+
+class SiteRecord:
+    """One monitored site - numeric fields only, no per-record dict"""
+
+    __slots__ = ("name", "url", "status", "response_time", "status_code", "traffic",
+                 "last_checked", "ssl_expiry_days", "version")
+
+    def __init__(self, name: str, url: str):
+        self.name = sys.intern(name)
+        self.url = url
+        self.status = STATUS_DOWN
+        self.response_time = 0.0
+        self.status_code = 0
+        self.traffic = 0
+        self.last_checked = 0.0  # epoch seconds
+        self.ssl_expiry_days = None
+        self.version = 0
+
+    def contribution(self) -> tuple:
+        """What this record adds to the stats counters - take it before mutating the record"""
+        is_up = self.status == STATUS_UP
+        return (
+            is_up,
+            self.response_time if is_up else 0.0,
+            self.ssl_expiry_days is not None and self.ssl_expiry_days <= 30,
+            self.ssl_expiry_days is not None and self.ssl_expiry_days <= 0,
+            self.status_code // 100 if self.status_code else 0,
+            self.traffic
+        )
+
+class StatsCounters:
+    """Aggregates behind /api/stats, updated per status change instead of recomputed per request"""
+
+    def __init__(self):
+        self.total = 0
+        self.up = 0
+        self.up_response_time = 0.0
+        self.ssl_expiring_soon = 0
+        self.ssl_expired = 0
+        self.by_code_class = [0] * 6  # index 0 = no response, 1-5 = 1xx-5xx
+        self.by_traffic = [0] * len(TRAFFIC_LABELS)
+
+    def apply(self, contribution: tuple, sign: int):
+        is_up, response_time, expiring, expired, code_class, traffic = contribution
+        self.total += sign
+        self.up += sign * is_up
+        self.up_response_time += sign * response_time
+        if self.up == 0:
+            self.up_response_time = 0.0  # don't let float drift accumulate
+        self.ssl_expiring_soon += sign * expiring
+        self.ssl_expired += sign * expired
+        self.by_code_class[code_class] += sign
+        self.by_traffic[traffic] += sign
+
+    def snapshot(self, breakdown: bool = False) -> dict:
+        stats = {
+            "total_websites": self.total,
+            "websites_up": self.up,
+            "websites_down": self.total - self.up,
+            "average_response_time": round(self.up_response_time / self.up, 3) if self.up > 0 else 0,
+            "ssl_expiring_soon": self.ssl_expiring_soon,
+            "ssl_expired": self.ssl_expired
+        }
+        if breakdown:
+            stats["status_code_classes"] = {
+                (f"{index}xx" if index else "none"): count for index, count in enumerate(self.by_code_class) if count
+            }
+            stats["traffic"] = {TRAFFIC_LABELS[index]: count for index, count in enumerate(self.by_traffic) if count}
+        return stats
+
+class SiteStore:
+    """Compact in-memory status store with a monotonic version for ETags and delta polling"""
+
+    def __init__(self, max_tombstones: int = MAX_TOMBSTONES):
+        self.records: Dict[str, SiteRecord] = {}
+        self.counters = StatsCounters()
+        self.version = 0
+        # Changes on every boot: versions from a previous run may be reused if the journal lost its tail
+        self.epoch = os.urandom(4).hex()
+        self.max_tombstones = max_tombstones
+        self._deleted: Dict[str, int] = {}  # tombstones, oldest first
+        self._tombstone_floor = 0  # deltas from before this version can't list every deletion
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.records
+
+    def get(self, name: str) -> Optional[SiteRecord]:
+        return self.records.get(name)
+
+    def names(self) -> List[str]:
+        return list(self.records)
+
+    def _bump(self, record: SiteRecord):
+        self.version += 1
+        record.version = self.version
+
+    def add(self, name: str, url: str) -> SiteRecord:
+        """Register a site (counted as down until its first result is recorded)"""
+        if name in self.records:
+            raise KeyError(f"Website '{name}' already exists")
+        record = SiteRecord(name, url)
+        self.records[record.name] = record
+        self._deleted.pop(name, None)
+        self.counters.apply(record.contribution(), +1)
+        self._bump(record)
+        return record
+
+    def record_result(self, record: SiteRecord, status: int, response_time: float, status_code: int,
+                      ssl_expiry_days: Optional[int], checked_at: float = None) -> bool:
+        """Store a probe result; False if the record was removed while the probe ran"""
+        if self.records.get(record.name) is not record:
+            return False
+        before = record.contribution()
+        record.status = status
+        record.response_time = round(response_time, 3)
+        record.status_code = status_code
+        record.traffic = traffic_code(response_time, status)
+        record.last_checked = checked_at if checked_at is not None else time.time()
+        record.ssl_expiry_days = ssl_expiry_days
+        self.counters.apply(before, -1)
+        self.counters.apply(record.contribution(), +1)
+        self._bump(record)
+        return True
+
+    def remove(self, name: str) -> Optional[SiteRecord]:
+        record = self.records.pop(name, None)
+        if record is None:
+            return None
+        self.counters.apply(record.contribution(), -1)
+        self.version += 1
+        self._deleted[name] = self.version
+        while len(self._deleted) > self.max_tombstones:
+            oldest = next(iter(self._deleted))
+            self._tombstone_floor = self._deleted.pop(oldest)
+        return record
+
+    def restore_version(self, version: int):
+        """Resume the version sequence after a reload; deletions from before it are unknown"""
+        self.version = max(self.version, version)
+        self._deleted.clear()
+        self._tombstone_floor = self.version
+
+    @property
+    def token(self) -> str:
+        """The version as handed to clients - "<epoch>.<version>", only comparable within one boot"""
+        return f"{self.epoch}.{self.version}"
+
+    def changes_since(self, token: str) -> tuple:
+        """(full, changed records, deleted names) after the version in token
+
+        full is True when token is from another boot (versions may have been
+        reused after a restart), when tombstones older than its version were
+        already pruned, or when it can't be parsed; changed then holds every record.
+        """
+        epoch, _, version = str(token).rpartition(".")
+        if epoch != self.epoch or not version.isdigit():
+            return True, list(self.records.values()), []
+        version = int(version)
+        if version < self._tombstone_floor or version > self.version:
+            return True, list(self.records.values()), []
+        changed = [record for record in self.records.values() if record.version > version]
+        deleted = [name for name, deleted_at in self._deleted.items() if deleted_at > version]
+        return False, changed, deleted
@@ -0,0 +1,88 @@
+# test_flapping.py - N-of-M confirmation, hysteresis and flap scoring
+#   python -m pytest test_flapping.py
+import asyncio
+from flapping import FlapDetector
+from scheduler import AdaptiveScheduler
+
+def detector() -> FlapDetector:
+    return FlapDetector(window=5, confirm_down=3, confirm_up=4, decay=0.8, flap_start=2.5, flap_stop=1.0)
+
+def feed(flaps: FlapDetector, name: str, statuses: list) -> list:
+    return [flaps.observe(name, status) for status in statuses]
+
+def test_clean_down_and_up_transition():
+    flaps = detector()
+    feed(flaps, "a", ["UP"] * 3)
+
+    # Going Down needs 3 failures in the window
+    results = feed(flaps, "a", ["Down"] * 3)
+    assert [confirmed for _, confirmed, _ in results] == ["UP", "UP", "Down"]
+    assert results[-1][0] == "UP"
+    assert not flaps.pending("a")
+
+    # Coming back needs 4 successes (hysteresis), pending until then
+    results = feed(flaps, "a", ["UP"] * 3)
+    assert [confirmed for _, confirmed, _ in results] == ["Down"] * 3
+    assert flaps.pending("a")
+    assert flaps.observe("a", "UP") == ("Down", "UP", None)
+    assert not flaps.pending("a")
+    assert flaps.stats()["confirmed_changes"] == 2
+    assert not flaps.is_flapping("a")
+
+def test_single_failure_is_not_confirmed():
+    flaps = detector()
+    results = feed(flaps, "a", ["UP", "Down", "UP", "UP"])
+    assert all(confirmed == "UP" for _, confirmed, _ in results)
+    assert flaps.stats()["confirmed_changes"] == 0
+
+def test_known_status_seeds_a_new_site():
+    flaps = detector()
+    assert flaps.observe("a", "UP", known="Down") == ("Down", "Down", None)
+    assert flaps.observe("b", "Down", known="Checking") == (None, "Down", None)
+
+def test_flapping_site_is_detected_and_settles():
+    flaps = detector()
+    events = [event for _, _, event in feed(flaps, "a", ["UP", "Down"] * 4)]
+    assert events.count("flapping") == 1
+    assert flaps.is_flapping("a")
+    # No quick re-probes while flapping
+    assert not flaps.pending("a")
+
+    events = [event for _, _, event in feed(flaps, "a", ["UP"] * 10)]
+    assert events.count("stable") == 1
+    assert not flaps.is_flapping("a")
+    assert flaps.observe("a", "UP")[1] == "UP"
+
+def test_retain_forgets_removed_sites():
+    flaps = detector()
+    feed(flaps, "a", ["UP"])
+    feed(flaps, "b", ["UP"])
+    flaps.retain({"b"})
+    assert flaps.stats()["sites"] == 1
+
+def test_scheduler_reprobes_pending_transitions_quickly():
+    flaps = detector()
+    feed(flaps, "a", ["UP"] * 3)
+    probes = []
+
+    async def probe(site):
+        probes.append(flaps.observe(site["name"], "Down")[1])
+        return probes[-1]
+
+    async def main():
+        scheduler = AdaptiveScheduler(probe, default_interval=60, jitter=0, min_interval=60,
+                                      confirm=flaps.pending, confirm_interval=0.01)
+        scheduler.add_site({"name": "a", "url": "https://a.example.com", "current_status": "Checking"})
+        task = asyncio.create_task(scheduler.run())
+        for _ in range(100):
+            if len(probes) == 3:
+                break
+            await asyncio.sleep(0.01)
+        await scheduler.stop()
+        await asyncio.gather(task, return_exceptions=True)
+        return scheduler.metrics()
+
+    metrics = asyncio.run(main())
+    # Both unconfirmed Downs were re-probed right away instead of after a minute
+    assert probes == ["UP", "UP", "Down"]
+    assert metrics["confirmations"] == 2
@@ -0,0 +1,33 @@
+# test_persistence.py - StoreJournal recovery after a crash mid-write
+#   python -m pytest test_persistence.py
+import asyncio
+from persistence import StoreJournal
+from store import SiteStore, STATUS_UP
+
+def record_site(store: SiteStore, journal: StoreJournal, name: str):
+    record = store.add(name, f"https://{name}.example.com")
+    store.record_result(record, STATUS_UP, 0.1, 200, None)
+    journal.log_put(record)
+
+def test_torn_log_line_does_not_swallow_later_entries(tmp_path):
+    store = SiteStore()
+    journal = StoreJournal(store, directory=str(tmp_path))
+    journal.load()
+    record_site(store, journal, "a")
+    record_site(store, journal, "b")
+    asyncio.run(journal.flush())
+
+    # Crash in the middle of writing the next entry
+    with open(journal.log_path, "a", encoding="utf-8") as f:
+        f.write('["put", 12, "c"')
+
+    store = SiteStore()
+    journal = StoreJournal(store, directory=str(tmp_path))
+    assert journal.load() == 2
+    record_site(store, journal, "d")
+    asyncio.run(journal.flush())
+
+    store = SiteStore()
+    journal = StoreJournal(store, directory=str(tmp_path))
+    assert journal.load() == 3
+    assert sorted(store.names()) == ["a", "b", "d"]
@@ -0,0 +1,67 @@
+# test_rollups.py - latency histogram quantiles and rollup windows
+#   python -m pytest test_rollups.py
+import random
+from datetime import datetime, timedelta
+import pytest
+from rollups import (HISTOGRAM_GAMMA, histogram_index, histogram_quantiles, merge_rollups,
+                     rollup_updates, window_filter)
+
+def test_histogram_quantiles_within_bucket_error():
+    rng = random.Random(7)
+    samples = [rng.lognormvariate(-1.5, 0.8) + 0.01 for _ in range(5000)]
+    hist = {}
+    for sample in samples:
+        index = histogram_index(sample)
+        hist[index] = hist.get(index, 0) + 1
+
+    ordered = sorted(samples)
+    quantiles = (0.5, 0.9, 0.95, 0.99)
+    estimates = histogram_quantiles(hist, quantiles, lower=ordered[0], upper=ordered[-1])
+    max_error = (HISTOGRAM_GAMMA - 1) / 2  # ~5%
+    for q, estimate in zip(quantiles, estimates):
+        exact = ordered[int(q * (len(ordered) - 1))]
+        assert abs(estimate - exact) / exact <= max_error + 1e-9, q
+
+def test_histogram_quantiles_clamped_to_min_and_max():
+    hist = {histogram_index(0.2): 10}
+    assert histogram_quantiles(hist, (0.0, 1.0), lower=0.2, upper=0.2) == [0.2, 0.2]
+    assert histogram_quantiles({}, (0.5,)) == [0]
+
+def test_window_filter_splits_into_minute_hour_and_day_buckets():
+    until = datetime(2026, 3, 2, 5, 17, 30)
+    since = datetime(2026, 2, 28, 22, 17, 30)
+    assert window_filter("a", since, until)["$or"] == [
+        {"granularity": "minute", "bucket": {"$gte": datetime(2026, 2, 28, 22, 17), "$lt": datetime(2026, 2, 28, 23)}},
+        {"granularity": "hour", "bucket": {"$gte": datetime(2026, 2, 28, 23), "$lt": datetime(2026, 3, 1)}},
+        {"granularity": "day", "bucket": {"$gte": datetime(2026, 3, 1), "$lt": until}}
+    ]
+
+def test_window_filter_skips_expired_minute_buckets():
+    until = datetime(2026, 3, 2, 5, 17, 30)
+    ranges = window_filter("a", until - timedelta(days=3, minutes=20), until)["$or"]
+    assert [r["granularity"] for r in ranges] == ["hour", "day"]
+    assert ranges[0]["bucket"]["$gte"] == datetime(2026, 2, 27, 4)
+
+def test_window_totals_match_raw_rows():
+    until = datetime(2026, 3, 2, 5, 17, 30)
+    since = datetime(2026, 2, 28, 22, 17, 30)
+    rng = random.Random(3)
+    rows, t = [], since - timedelta(hours=2)
+    while t < until:
+        rows.append({"name": "a", "status": rng.choice(["UP", "UP", "Down"]),
+                     "response_time": rng.uniform(0.05, 2.0), "checked_at": t})
+        t += timedelta(minutes=7, seconds=13)
+
+    mongomock = pytest.importorskip("mongomock")
+    rollups = mongomock.MongoClient().db.analytics
+    rollups.bulk_write(rollup_updates(rows), ordered=False)
+    totals = merge_rollups(list(rollups.find(window_filter("a", since, until))))
+
+    # Buckets are whole minutes, so the window starts at since's minute
+    expected = [row for row in rows if row["checked_at"] >= since.replace(second=0)]
+    assert totals["count"] == len(expected)
+    assert totals["up"] == sum(row["status"] == "UP" for row in expected)
+    assert totals["rt_count"] == len(expected)
+    assert abs(totals["rt_sum"] - sum(row["response_time"] for row in expected)) < 1e-6
+    assert totals["rt_min"] == min(row["response_time"] for row in expected)
+    assert sum(totals["hist"].values()) == len(expected)
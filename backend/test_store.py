@@ -0,0 +1,90 @@
+# test_store.py - incremental stats counters and delta polling
+#   python -m pytest test_store.py
+import random
+from store import SiteStore, StatsCounters, STATUS_UP, STATUS_DOWN
+
+def recount(store: SiteStore) -> StatsCounters:
+    counters = StatsCounters()
+    for record in store.records.values():
+        counters.apply(record.contribution(), +1)
+    return counters
+
+def assert_counters_match(store: SiteStore):
+    expected = recount(store).snapshot(breakdown=True)
+    actual = store.counters.snapshot(breakdown=True)
+    assert abs(actual.pop("average_response_time") - expected.pop("average_response_time")) < 0.002
+    assert actual == expected
+
+def test_counters_match_full_recount():
+    rng = random.Random(11)
+    store = SiteStore()
+    for step in range(2000):
+        names = store.names()
+        action = rng.random()
+        if action < 0.3 or not names:
+            name = f"site-{rng.randrange(200)}"
+            if name not in store:
+                store.add(name, f"https://{name}.example.com")
+        elif action < 0.85:
+            record = store.get(rng.choice(names))
+            status = rng.choice([STATUS_UP, STATUS_DOWN])
+            store.record_result(
+                record, status, rng.uniform(0.05, 4.0),
+                rng.choice([200, 301, 404, 503]) if status == STATUS_UP or rng.random() < 0.5 else 0,
+                rng.choice([None, -3, 12, 90])
+            )
+        else:
+            store.remove(rng.choice(names))
+        if step % 100 == 0:
+            assert_counters_match(store)
+    assert_counters_match(store)
+
+def test_stale_record_result_is_ignored():
+    store = SiteStore()
+    record = store.add("a", "https://a.example.com")
+    store.remove("a")
+    store.add("a", "https://a.example.com")
+    assert not store.record_result(record, STATUS_UP, 0.1, 200, None)
+    assert_counters_match(store)
+    assert store.counters.snapshot()["websites_up"] == 0
+
+def test_changes_since_lists_changes_and_deletions():
+    store = SiteStore()
+    store.add("a", "https://a.example.com")
+    store.add("b", "https://b.example.com")
+    token = store.token
+    store.record_result(store.get("a"), STATUS_UP, 0.2, 200, None)
+    store.remove("b")
+    store.add("c", "https://c.example.com")
+
+    full, changed, deleted = store.changes_since(token)
+    assert not full
+    assert sorted(record.name for record in changed) == ["a", "c"]
+    assert deleted == ["b"]
+    assert store.changes_since(store.token) == (False, [], [])
+
+def test_changes_since_is_full_below_the_tombstone_floor():
+    store = SiteStore(max_tombstones=2)
+    for name in "abcd":
+        store.add(name, f"https://{name}.example.com")
+    token = store.token
+    for name in "abc":
+        store.remove(name)  # the tombstone of "a" is pruned
+
+    full, changed, deleted = store.changes_since(token)
+    assert full
+    assert [record.name for record in changed] == ["d"]
+    assert deleted == []
+    # Versions after the floor still get a delta
+    assert store.changes_since(f"{store.epoch}.{store.version - 1}") == (False, [], ["c"])
+
+def test_changes_since_is_full_for_other_boots_and_reloads():
+    store = SiteStore()
+    store.add("a", "https://a.example.com")
+    assert store.changes_since(f"{SiteStore().epoch}.1")[0]
+    assert store.changes_since("1")[0]
+    assert store.changes_since(f"{store.epoch}.{store.version + 5}")[0]
+
+    store.restore_version(10)
+    assert store.changes_since(f"{store.epoch}.9")[0]
+    assert not store.changes_since(f"{store.epoch}.10")[0]
@@ -0,0 +1,367 @@
+import asyncio
+import json
+import os
+import shutil
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from urllib.parse import quote, unquote
+
+import numpy as np
+
+# Used instead of status_history/analytics when HISTORY_BACKEND=columnar
+HISTORY_DIR = os.getenv("HISTORY_DIR", os.path.join("data", "history"))
+
+# One fixed-size record per check, 11 bytes packed. Timestamps are stored as the
+# millisecond offset from the start of the chunk's UTC day.
+RECORD = np.dtype([
+    ("offset_ms", "<u4"),
+    ("response_time", "<f4"),  # seconds, NaN when there was no response
+    ("status_code", "<u2"),    # 0 when there was no response
+    ("status", "u1")           # index into STATUS_NAMES
+])
+STATUS_NAMES = ("UP", "Down")
+DAY_MS = 86_400_000
+EPOCH = datetime(1970, 1, 1)
+
+def to_ms(moment: datetime) -> int:
+    """Naive UTC datetime -> epoch milliseconds"""
+    return (moment - EPOCH) // timedelta(milliseconds=1)
+
+def from_ms(ms: int) -> datetime:
+    return EPOCH + timedelta(milliseconds=int(ms))
+
+class ColumnarHistory:
+    """Append-only per-site chunk files, one per UTC day
+
+        {directory}/{quoted site name}/site.json       name and url
+        {directory}/{quoted site name}/YYYY-MM-DD.ts   RECORD rows
+        {directory}/{quoted site name}/changes.jsonl   status change events
+
+    Chunks are read through np.memmap and every scan is a handful of vectorized
+    NumPy operations. A torn record at the end of a chunk (crash mid-append) is
+    ignored. Retention deletes whole chunk files and trims changes.jsonl to the
+    days that are kept.
+    """
+
+    def __init__(self, directory: str = HISTORY_DIR):
+        self.directory = directory
+        self._urls: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    # ---------- Layout ----------
+
+    def _site_dir(self, name: str) -> str:
+        # quote() keeps dots, escape them too so no name maps to "." or ".."
+        return os.path.join(self.directory, quote(name, safe="").replace(".", "%2E"))
+
+    def _chunk_path(self, name: str, day: int) -> str:
+        return os.path.join(self._site_dir(name), f"{from_ms(day * DAY_MS):%Y-%m-%d}.ts")
+
+    def sites(self) -> List[str]:
+        if not os.path.isdir(self.directory):
+            return []
+        return [unquote(entry) for entry in os.listdir(self.directory)]
+
+    def site_url(self, name: str) -> Optional[str]:
+        if name not in self._urls:
+            try:
+                with open(os.path.join(self._site_dir(name), "site.json"), encoding="utf-8") as f:
+                    self._urls[name] = json.load(f).get("url")
+            except (OSError, ValueError):
+                return None
+        return self._urls[name]
+
+    def _remember_url(self, name: str, url: Optional[str]):
+        if url is None or self._urls.get(name) == url:
+            return
+        os.makedirs(self._site_dir(name), exist_ok=True)
+        with open(os.path.join(self._site_dir(name), "site.json"), "w", encoding="utf-8") as f:
+            json.dump({"name": name, "url": url}, f)
+        self._urls[name] = url
+
+    # ---------- Writing ----------
+
+    def append(self, documents: list):
+        """Append status_history-shaped documents (checks and status_change events)"""
+        chunks = {}   # (name, day) -> rows
+        changes = {}  # name -> json lines
+        urls = {}
+        for document in documents:
+            name = document["name"]
+            if document.get("event_type") == "status_change":
+                changes.setdefault(name, []).append(json.dumps({
+                    "old_status": document.get("old_status"),
+                    "new_status": document.get("new_status"),
+                    "changed_at": to_ms(document["changed_at"])
+                }) + "\n")
+                continue
+            ms = to_ms(document["checked_at"])
+            day = ms // DAY_MS
+            response_time = document.get("response_time")
+            chunks.setdefault((name, day), []).append((
+                ms - day * DAY_MS,
+                np.nan if response_time is None else response_time,
+                document.get("status_code") or 0,
+                0 if document.get("status") == "UP" else 1
+            ))
+            urls[name] = document.get("url")
+
+        with self._lock:
+            for name, url in urls.items():
+                self._remember_url(name, url)
+            for (name, day), rows in chunks.items():
+                os.makedirs(self._site_dir(name), exist_ok=True)
+                with open(self._chunk_path(name, day), "ab") as f:
+                    # Drop a partial record left by a crash, or every record after it would be misaligned
+                    end = f.seek(0, os.SEEK_END)
+                    if end % RECORD.itemsize:
+                        f.truncate(end - end % RECORD.itemsize)
+                    f.write(np.array(rows, dtype=RECORD).tobytes())
+            for name, lines in changes.items():
+                os.makedirs(self._site_dir(name), exist_ok=True)
+                with open(os.path.join(self._site_dir(name), "changes.jsonl"), "a", encoding="utf-8") as f:
+                    f.write("".join(lines))
+
+    async def insert_many(self, documents: list, ordered: bool = False):
+        """Collection-style entry point, so WriteBuffer can flush history here"""
+        await asyncio.to_thread(self.append, documents)
+
+    # ---------- Reading ----------
+
+    def _map(self, path: str):
+        try:
+            count = os.path.getsize(path) // RECORD.itemsize
+        except OSError:
+            return None
+        if count == 0:
+            return None
+        return np.memmap(path, dtype=RECORD, mode="r", shape=(count,))
+
+    def scan(self, name: str, since: datetime, until: datetime = None) -> tuple:
+        """(epoch ms, records) for one site in [since, until), oldest chunk first"""
+        since_ms = to_ms(since)
+        until_ms = to_ms(until or datetime.utcnow()) + 1
+        timestamps, records = [], []
+        for day in range(since_ms // DAY_MS, (until_ms - 1) // DAY_MS + 1):
+            chunk = self._map(self._chunk_path(name, day))
+            if chunk is None:
+                continue
+            ts = chunk["offset_ms"].astype(np.int64) + day * DAY_MS
+            mask = (ts >= since_ms) & (ts < until_ms)
+            timestamps.append(ts[mask])
+            records.append(np.array(chunk[mask]))  # copy out so the mapping can be released
+            del chunk
+        if not records:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=RECORD)
+        return np.concatenate(timestamps), np.concatenate(records)
+
+    def history(self, name: str, since: datetime, limit: int) -> list:
+        timestamps, records = self.scan(name, since)
+        url = self.site_url(name) or ""
+        newest = np.argsort(timestamps, kind="stable")[::-1][:limit]
+        rows = []
+        for index in newest:
+            record = records[index]
+            response_time = float(record["response_time"])
+            rows.append({
+                "name": name,
+                "url": url,
+                "status": STATUS_NAMES[record["status"]],
+                "response_time": None if np.isnan(response_time) else round(response_time, 3),
+                "status_code": int(record["status_code"]) or None,
+                "checked_at": from_ms(timestamps[index])
+            })
+        return rows
+
+    def totals(self, name: str, since: datetime) -> dict:
+        """Check counts and response-time statistics for one site"""
+        _, records = self.scan(name, since)
+        up = int(np.count_nonzero(records["status"] == 0))
+        response_times = records["response_time"][~np.isnan(records["response_time"])].astype(np.float64)
+        totals = {"count": len(records), "up": up, "rt_count": len(response_times)}
+        if len(response_times):
+            p50, p95, p99 = np.percentile(response_times, [50, 95, 99])
+            totals.update(rt_mean=float(response_times.mean()), rt_min=float(response_times.min()),
+                          rt_max=float(response_times.max()), p50=float(p50), p95=float(p95), p99=float(p99))
+        return totals
+
+    def hourly(self, name: str, since: datetime) -> list:
+        timestamps, records = self.scan(name, since)
+        if not len(records):
+            return []
+        hours = timestamps // 3_600_000
+        first = int(hours.min())
+        slots = hours - first
+        counts = np.bincount(slots)
+        up_counts = np.bincount(slots, weights=(records["status"] == 0)).astype(np.int64)
+        trend = []
+        for slot in np.flatnonzero(counts):
+            total_checks, up_count = int(counts[slot]), int(up_counts[slot])
+            trend.append({
+                "hour": from_ms((first + slot) * 3_600_000).strftime("%Y-%m-%d %H:00"),
+                "total_checks": total_checks,
+                "up_count": up_count,
+                "down_count": total_checks - up_count,
+                "uptime_percentage": (up_count / total_checks) * 100
+            })
+        return trend
+
+    # ---------- Retention ----------
+
+    def drop_before(self, cutoff: datetime) -> int:
+        """Delete every chunk whose whole day is before cutoff, and the status changes from those days
+
+        Returns the number of chunk files removed.
+        """
+        oldest_kept = f"{cutoff:%Y-%m-%d}.ts"
+        oldest_kept_ms = to_ms(cutoff) // DAY_MS * DAY_MS
+        removed = 0
+        for name in self.sites():
+            site_dir = self._site_dir(name)
+            for entry in os.listdir(site_dir):
+                if entry.endswith(".ts") and entry < oldest_kept:
+                    os.remove(os.path.join(site_dir, entry))
+                    removed += 1
+            self._trim_changes(name, oldest_kept_ms)
+        return removed
+
+    def _trim_changes(self, name: str, oldest_kept_ms: int):
+        path = os.path.join(self._site_dir(name), "changes.jsonl")
+        # Under the lock so no append lands between the read and the replace
+        with self._lock:
+            try:
+                with open(path, encoding="utf-8") as f:
+                    lines = f.readlines()
+            except OSError:
+                return
+            kept = []
+            for line in lines:
+                try:
+                    if json.loads(line)["changed_at"] >= oldest_kept_ms:
+                        kept.append(line)
+                except (ValueError, KeyError, TypeError):
+                    continue  # torn or unreadable line
+            if len(kept) == len(lines):
+                return
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                f.write("".join(kept))
+            os.replace(path + ".tmp", path)
+
+    def remove_site(self, name: str):
+        with self._lock:
+            shutil.rmtree(self._site_dir(name), ignore_errors=True)
+            self._urls.pop(name, None)
+
+history_store = ColumnarHistory()
+
+# ---------- database.py-compatible API ----------
+
+async def log_status_history(name: str, url: str, status: str, response_time: float = None, status_code: int = None):
+    """Log each status check with detailed information"""
+    try:
+        await history_store.insert_many([{
+            "name": name,
+            "url": url,
+            "status": status,
+            "response_time": response_time,
+            "status_code": status_code,
+            "checked_at": datetime.utcnow()
+        }])
+    except Exception as e:
+        print(f"Error logging status history: {e}")
+
+async def log_status_change(name: str, old_status: str, new_status: str):
+    """Log when a website status changes"""
+    try:
+        await history_store.insert_many([{
+            "name": name,
+            "event_type": "status_change",
+            "old_status": old_status,
+            "new_status": new_status,
+            "changed_at": datetime.utcnow()
+        }])
+    except Exception as e:
+        print(f"Error logging status change: {e}")
+
+async def get_status_history(name: str, hours: int = 24, limit: int = 100):
+    """Get status history for a website"""
+    try:
+        since = datetime.utcnow() - timedelta(hours=hours)
+        return await asyncio.to_thread(history_store.history, name, since, limit)
+    except Exception as e:
+        print(f"Error fetching status history: {e}")
+        return []
+
+async def get_uptime_analytics(name: str, hours: int = 24):
+    """Calculate uptime statistics for a website (from chunk files)"""
+    try:
+        totals = await asyncio.to_thread(history_store.totals, name, datetime.utcnow() - timedelta(hours=hours))
+        total_checks = totals["count"]
+        up_checks = totals["up"]
+
+        if total_checks == 0:
+            return {"uptime_percentage": 0, "total_checks": 0, "up_checks": 0, "down_checks": 0}
+
+        return {
+            "uptime_percentage": round((up_checks / total_checks) * 100, 2),
+            "total_checks": total_checks,
+            "up_checks": up_checks,
+            "down_checks": total_checks - up_checks
+        }
+    except Exception as e:
+        print(f"Error calculating uptime analytics: {e}")
+        return {"uptime_percentage": 0, "total_checks": 0, "up_checks": 0, "down_checks": 0}
+
+async def get_response_time_analytics(name: str, hours: int = 24):
+    """Get response time analytics for a website (exact percentiles from chunk files)"""
+    empty = {"avg_response_time": 0, "min_response_time": 0, "max_response_time": 0,
+             "p50_response_time": 0, "p95_response_time": 0, "p99_response_time": 0, "total_measurements": 0}
+    try:
+        totals = await asyncio.to_thread(history_store.totals, name, datetime.utcnow() - timedelta(hours=hours))
+        if not totals["rt_count"]:
+            return empty
+        return {
+            "avg_response_time": round(totals["rt_mean"], 3),
+            "min_response_time": round(totals["rt_min"], 3),
+            "max_response_time": round(totals["rt_max"], 3),
+            "p50_response_time": round(totals["p50"], 3),
+            "p95_response_time": round(totals["p95"], 3),
+            "p99_response_time": round(totals["p99"], 3),
+            "total_measurements": totals["rt_count"]
+        }
+    except Exception as e:
+        print(f"Error calculating response time analytics: {e}")
+        return empty
+
+async def get_hourly_status_trend(name: str, hours: int = 24):
+    """Get hourly status trends for charts"""
+    try:
+        # Whole first hour, like the hourly rollups
+        since = datetime.utcnow() - timedelta(hours=hours)
+        return await asyncio.to_thread(history_store.hourly, name, since.replace(minute=0, second=0, microsecond=0))
+    except Exception as e:
+        print(f"Error getting hourly trend: {e}")
+        return []
+
+async def get_summary_stats(hours: int = 24) -> dict:
+    """name -> total_checks, up_checks, avg_response_time over the last `hours` hours"""
+    since = datetime.utcnow() - timedelta(hours=hours)
+
+    def collect():
+        stats = {}
+        for name in history_store.sites():
+            totals = history_store.totals(name, since)
+            stats[name] = {"total_checks": totals["count"], "up_checks": totals["up"],
+                           "avg_response_time": totals.get("rt_mean")}
+        return stats
+
+    return await asyncio.to_thread(collect)
+
+async def remove_history(name: str):
+    await asyncio.to_thread(history_store.remove_site, name)
+
+async def cleanup_old_history(days_to_keep: int = 30) -> int:
+    """Drop chunk files older than days_to_keep days"""
+    cutoff = datetime.utcnow() - timedelta(days=days_to_keep)
+    return await asyncio.to_thread(history_store.drop_before, cutoff)
@@ -3,17 +3,11 @@ import time
 import requests
 from http import HTTPStatus
 
-import motor.motor_asyncio
 from model import Status
-import os
-from dotenv import load_dotenv
-load_dotenv()
-DB_URL = os.getenv("DB_URL")
+import mongo
 
-client = motor.motor_asyncio.AsyncIOMotorClient(DB_URL)
-
-database = client.StatusList
-collection = database.status
+# Shared client settings (DB_URL, DB_NAME, pool size) live in mongo.py
+collection = mongo.collection("status")
  
 # get the status of a website
 def get_website_status(url):
@@ -0,0 +1,167 @@
+import asyncio
+import os
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from rollups import rollup_updates
+
+# Write-behind buffer configuration
+WRITE_BUFFER_SIZE = int(os.getenv("WRITE_BUFFER_SIZE", "500"))
+WRITE_BUFFER_FLUSH_SECONDS = float(os.getenv("WRITE_BUFFER_FLUSH_SECONDS", "2"))
+WRITE_BUFFER_MAX_PENDING = int(os.getenv("WRITE_BUFFER_MAX_PENDING", "50000"))
+
+class WriteBuffer:
+    """Write-behind buffer for the checker's status and history writes
+
+    History rows are written with one insert_many and status updates with one
+    bulk_write per flush. Several updates to the same site between flushes are
+    merged into a single UpdateOne. A flush happens when WRITE_BUFFER_SIZE
+    writes are pending or every WRITE_BUFFER_FLUSH_SECONDS, whichever is first.
+    When a rollup collection is given, each flushed history batch is also added
+    to the minute/hour/day rollups (see rollups.py). history_collection can
+    also be any object with an async insert_many, e.g. tsstore.history_store.
+    on_history_written(rows) is called after each batch of history rows (and
+    its rollups) has been written.
+    """
+
+    def __init__(self, status_collection, history_collection, rollup_collection=None,
+                 max_size: int = WRITE_BUFFER_SIZE, flush_interval: float = WRITE_BUFFER_FLUSH_SECONDS,
+                 max_pending: int = WRITE_BUFFER_MAX_PENDING, on_history_written=None):
+        self.status_collection = status_collection
+        self.history_collection = history_collection
+        self.rollup_collection = rollup_collection
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.on_history_written = on_history_written
+        self._history = []
+        self._status = {}  # name -> fields to $set
+        self._lock = asyncio.Lock()
+        self._full = asyncio.Event()
+        self._task = None
+        self._closing = False
+        self._stats = {"flushes": 0, "history_written": 0, "status_written": 0, "dropped": 0}
+
+    def pending(self) -> int:
+        return len(self._history) + len(self._status)
+
+    def update_status(self, name: str, fields: dict):
+        """Queue a $set on the site's status document"""
+        self._status.setdefault(name, {}).update(fields)
+        self._check_size()
+
+    def add_history(self, document: dict):
+        """Queue a status_history row"""
+        self._history.append(document)
+        self._check_size()
+
+    def _check_size(self):
+        if self.pending() >= self.max_size:
+            self._full.set()
+
+    async def flush(self):
+        """Write everything that is pending"""
+        async with self._lock:
+            history, self._history = self._history, []
+            status, self._status = self._status, {}
+            if not history and not status:
+                return
+
+            # History and status are written independently - a failure in one never loses the other
+            retry_history = await self._write_history(history)
+            retry_status = await self._write_status(status)
+            if retry_history or retry_status:
+                self._requeue(retry_history, retry_status)
+            else:
+                self._stats["flushes"] += 1
+
+    async def _write_history(self, rows: list) -> list:
+        """Insert history rows and roll up the ones that landed, returns the rows to retry"""
+        if not rows:
+            return []
+        try:
+            await self.history_collection.insert_many(rows, ordered=False)
+            written = rows
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            # insert_many gave every row its _id, so a duplicate key means the row landed on an
+            # earlier attempt that failed before its rollups ran - count it as written now
+            rejected = {error["index"] for error in errors if error.get("code") != 11000}
+            written = [row for index, row in enumerate(rows) if index not in rejected]
+            if rejected:
+                # Per-document errors won't succeed on retry
+                print(f"Write buffer flush had {len(rejected)} rejected history rows")
+        except Exception as e:
+            print(f"Error flushing history: {e}")
+            return rows
+        self._stats["history_written"] += len(written)
+        if self.rollup_collection is not None and written:
+            await self._write_rollups(written)
+        if self.on_history_written is not None and written:
+            self.on_history_written(written)
+        return []
+
+    async def _write_status(self, status: dict) -> dict:
+        """Apply the merged status updates, returns the updates to retry"""
+        if not status:
+            return {}
+        try:
+            await self.status_collection.bulk_write(
+                [UpdateOne({"name": name}, {"$set": fields}) for name, fields in status.items()],
+                ordered=False
+            )
+            self._stats["status_written"] += len(status)
+        except BulkWriteError as e:
+            rejected = len(e.details.get("writeErrors", []))
+            self._stats["status_written"] += len(status) - rejected
+            print(f"Write buffer flush had {rejected} rejected status updates")
+        except Exception as e:
+            print(f"Error flushing status updates: {e}")
+            return status
+        return {}
+
+    async def _write_rollups(self, rows: list):
+        # Rollup increments are not idempotent, so they are never retried
+        try:
+            updates = rollup_updates(rows)
+            if updates:
+                await self.rollup_collection.bulk_write(updates, ordered=False)
+        except Exception as e:
+            print(f"Error updating rollups: {e}")
+
+    def _requeue(self, history: list, status: dict):
+        # Put failed writes back in front of newer ones, unless the backlog is already too big
+        if self.pending() + len(history) + len(status) > self.max_pending:
+            self._stats["dropped"] += len(history) + len(status)
+            print(f"Write buffer backlog full, dropped {len(history) + len(status)} writes")
+            return
+        self._history = history + self._history
+        for name, fields in status.items():
+            self._status[name] = {**fields, **self._status.get(name, {})}
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            await self.flush()
+
+    def start(self):
+        """Start the background flusher"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Stop the background flusher and write whatever is still pending"""
+        # Let an in-progress flush finish instead of cancelling it halfway
+        self._closing = True
+        self._full.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        await self.flush()
+        self._closing = False
+
+    def stats(self) -> dict:
+        return {**self._stats, "pending": self.pending()}